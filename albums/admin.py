@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Album, Photo, AlbumTemplate, AlbumPage, PhotoEdit
+from .models import Album, Photo, AlbumTemplate, AlbumPage, PhotoEdit, EditPreset
 
 @admin.register(Album)
 class AlbumAdmin(admin.ModelAdmin):
@@ -29,3 +29,8 @@ class AlbumPageAdmin(admin.ModelAdmin):
 class PhotoEditAdmin(admin.ModelAdmin):
     list_display = ['photo', 'created_at']
     list_filter = ['created_at']
+
+@admin.register(EditPreset)
+class EditPresetAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'created_at']
+    search_fields = ['name']
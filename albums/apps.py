@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AlbumsConfig(AppConfig):
     name = 'albums'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from . import signals  # noqa: F401
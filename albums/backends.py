@@ -0,0 +1,72 @@
+"""Бэкенд авторизации со снимком пользователя в кэше.
+
+AuthenticationMiddleware на каждый запрос достаёт пользователя по id из
+сессии. Вместо SELECT из albums_user бэкенд собирает его из снимка в
+кэше: только поля, нужные страницам (SNAPSHOT_FIELDS), и готовый хэш
+сессии. Остальные поля (password, last_login, date_joined) отложены и
+подгрузятся из БД при обращении.
+
+Снимок сбрасывают сигналы (signals.py) при сохранении и удалении
+пользователя - сразу и ещё раз после коммита. Сессии лежат в кэше
+(cached_db), так что страница залогиненного пользователя в
+установившемся режиме не делает запросов авторизации.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router, transaction
+
+from .models import User
+
+SNAPSHOT_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name',
+    'is_premium', 'premium_until', 'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def snapshot_key(user_id):
+    return f'albums:user:{user_id}'
+
+
+def make_snapshot(user):
+    snapshot = {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+    snapshot['session_hash'] = user.get_session_auth_hash()
+    return snapshot
+
+
+def partial_user(values):
+    """Пользователь из готовых значений полей, остальные поля отложены"""
+    fields = [field for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(
+        router.db_for_read(User),
+        [field.attname for field in fields],
+        [values[field.attname] for field in fields],
+    )
+
+
+def from_snapshot(snapshot):
+    user = partial_user({field: snapshot[field] for field in SNAPSHOT_FIELDS})
+    user._session_auth_hash = snapshot['session_hash']
+    return user
+
+
+def invalidate_user(user_id):
+    cache.delete(snapshot_key(user_id))
+    transaction.on_commit(lambda: cache.delete(snapshot_key(user_id)))
+
+
+class CachedUserBackend(ModelBackend):
+    def get_user(self, user_id):
+        try:
+            key = snapshot_key(int(user_id))
+        except (TypeError, ValueError):
+            return None
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            user = from_snapshot(snapshot)
+        else:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, make_snapshot(user), settings.USER_SNAPSHOT_CACHE_SECONDS)
+        return user if self.user_can_authenticate(user) else None
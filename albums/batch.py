@@ -0,0 +1,125 @@
+"""POST /api/batch/ - несколько запросов к API одним запросом.
+
+    {"requests": [
+        {"method": "POST", "path": "/api/photos/5/reorder/", "body": {"order_index": 2}},
+        {"method": "PATCH", "path": "/api/pages/3/", "body": {"page_number": 1}}
+    ]}
+
+Подзапросы идут через обычные вьюсеты роутера по очереди в одной
+транзакции. Пользователь уже аутентифицирован внешним запросом и
+передаётся подзапросам как есть (без повторной проверки токена).
+Ответ - статус и данные каждого подзапроса. Если какой-то подзапрос
+вернул ошибку, транзакция откатывается целиком, а оставшиеся не
+выполняются (статус 424).
+
+Пока транзакция не закоммичена, подзапросы не пишут за её пределы: GET
+деталей альбома обходит кэш, просмотры учитываются после коммита, а
+метка реестра шаблонов, сменённая внутри откатанного batch, сменяется
+ещё раз - иначе процесс остался бы с откатанными шаблонами.
+"""
+import io
+import json
+import logging
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+API_PREFIX = '/api/'
+# Условный GET относится к самому batch, а не к подзапросам
+OUTER_ONLY_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+class BatchError(Exception):
+    pass
+
+
+def sub_request(request, method, path, body):
+    """Django-запрос к path с окружением внешнего запроса и его пользователем"""
+    url = urlsplit(path)
+    payload = b'' if body is None else json.dumps(body).encode()
+    environ = {
+        **{key: value for key, value in request.META.items() if key not in OUTER_ONLY_HEADERS},
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+    }
+    sub = WSGIRequest(environ)
+    # DRF возьмёт пользователя отсюда (ForcedAuthentication), токен не разбирается заново
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    sub.in_batch = True
+    return sub
+
+
+def in_batch(request):
+    """Подзапрос batch: его транзакция ещё может откатиться"""
+    return getattr(request, 'in_batch', False)
+
+
+def resolve_api(path):
+    path = urlsplit(path).path
+    if not path.startswith(API_PREFIX):
+        raise BatchError('Разрешены только пути /api/')
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if match.url_name == 'batch':
+        raise BatchError('Вложенный batch не поддерживается')
+    if not hasattr(match.func, 'cls'):
+        # Обычные вьюхи Django (формы HTMX) ждут сессию и middleware
+        raise BatchError('Разрешены только эндпоинты REST API')
+    return match
+
+
+def run_one(request, item):
+    match = resolve_api(item['path'])
+    if match is None:
+        return {'status': status.HTTP_404_NOT_FOUND, 'data': {'detail': 'Не найдено.'}}
+
+    response = match.func(sub_request(request, item['method'], item['path'], item.get('body')),
+                          *match.args, **match.kwargs)
+    data = getattr(response, 'data', None)
+    if data is None and hasattr(response, 'render'):
+        response.render()
+    if data is None and response.content:
+        # Не DRF-ответ (редирект, 304 и т.п.) - отдаём как текст
+        data = response.content.decode(response.charset or 'utf-8', 'replace')
+    return {'status': response.status_code, 'data': data}
+
+
+def run_batch(request, items):
+    """Выполняет подзапросы в одной транзакции. Возвращает (результаты, всё ли успешно)"""
+    results = []
+    templates_version = registry.version()
+    with transaction.atomic():
+        for item in items:
+            try:
+                result = run_one(request, item)
+            except BatchError as exc:
+                result = {'status': status.HTTP_400_BAD_REQUEST, 'data': {'detail': str(exc)}}
+            except Exception:
+                logger.exception('Ошибка подзапроса batch %s %s', item['method'], item['path'])
+                result = {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'data': None}
+            results.append(result)
+            if result['status'] >= 400:
+                transaction.set_rollback(True)
+                break
+
+    ok = len(results) == len(items) and all(result['status'] < 400 for result in results)
+    if not ok and registry.version() != templates_version:
+        registry.bump()
+    skipped = {'status': status.HTTP_424_FAILED_DEPENDENCY, 'data': None}
+    results += [skipped] * (len(items) - len(results))
+    return results, ok
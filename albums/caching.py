@@ -0,0 +1,75 @@
+"""Кэш ответа GET /api/albums/{id}/.
+
+Ключ - альбом и класс зрителя: владелец или посетитель (посетителю
+кэшируются только публичные альбомы). В записи лежит владелец альбома,
+поэтому проверка доступа тоже обходится без БД. Просмотры
+хранятся значением из БД, буфер albums.counters добавляется при отдаче.
+
+Сбрасывают кэш сигналы (signals.py) после коммита транзакции, иначе
+параллельный запрос успел бы закэшировать старые данные.
+
+Метка владельцев (owners_changed) - время последней смены username или
+премиума у любого владельца. Она входит в валидаторы условного GET
+альбомов: в ответах есть user_username, а агрегатом по альбомам
+переименование не поймать, и Last-Modified без неё не сдвинулся бы.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+OWNERS_CHANGED_KEY = 'albums:owners:changed'
+OWNER = 'owner'
+VISITOR = 'visitor'
+
+
+def detail_key(album_id, viewer):
+    return f'albums:detail:{album_id}:{viewer}'
+
+
+def get_detail(album_id, user):
+    """Закэшированная запись {'data', 'state'}, если она есть и зрителю можно её видеть"""
+    keys = {viewer: detail_key(album_id, viewer) for viewer in (OWNER, VISITOR)}
+    entries = cache.get_many(keys.values())
+    owner = entries.get(keys[OWNER])
+    if owner and user.is_authenticated and owner['user_id'] == user.pk:
+        return owner
+    visitor = entries.get(keys[VISITOR])
+    if visitor and visitor['user_id'] != user.pk:
+        return visitor
+    return None
+
+
+def set_detail(album, user, data, state):
+    """state - валидаторы условного GET (albums/conditional.py) на момент сериализации"""
+    if user.is_authenticated and album.user_id == user.pk:
+        viewer = OWNER
+    elif album.is_public:
+        viewer = VISITOR
+    else:
+        return
+    cache.set(
+        detail_key(album.pk, viewer),
+        {'user_id': album.user_id, 'data': data, 'state': state},
+        settings.ALBUM_DETAIL_CACHE_SECONDS,
+    )
+
+
+def invalidate_albums(album_ids):
+    keys = [detail_key(pk, viewer) for pk in set(album_ids) for viewer in (OWNER, VISITOR)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def owners_changed():
+    changed = cache.get(OWNERS_CHANGED_KEY)
+    if changed is None:
+        # Метки нет (кэш очищен или вытеснен) - считаем, что владельцы менялись сейчас
+        cache.add(OWNERS_CHANGED_KEY, timezone.now(), None)
+        changed = cache.get(OWNERS_CHANGED_KEY)
+    return changed
+
+
+def bump_owners():
+    """Владелец альбомов сменил username или премиум"""
+    transaction.on_commit(lambda: cache.set(OWNERS_CHANGED_KEY, timezone.now(), None))
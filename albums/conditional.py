@@ -0,0 +1,82 @@
+"""Условный GET (ETag / Last-Modified) для вьюсетов API.
+
+Валидаторы считаются одним агрегатным запросом по updated_at записи
+и её дочерних строк (max + count, чтобы ловить и удаления), без
+сериализации. Если клиент прислал совпадающие If-None-Match или
+If-Modified-Since, отвечаем 304 до запуска сериализатора.
+
+ETag слабый: просмотры альбома (views_count) в валидаторы не входят,
+иначе каждый GET менял бы его сам.
+"""
+import hashlib
+from datetime import datetime
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def child_stats(model, fk, prefix, field='updated_at'):
+    """Аннотации <prefix>_changed / <prefix>_total: max(field) и count
+    дочерних строк записи OuterRef('pk')"""
+    children = model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk)
+    return {
+        f'{prefix}_changed': Subquery(children.annotate(changed=Max(field)).values('changed')),
+        f'{prefix}_total': Subquery(children.annotate(total=Count('pk')).values('total')),
+    }
+
+
+def make_etag(*parts):
+    return 'W/"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def last_modified(state):
+    moments = [value for value in state if isinstance(value, datetime)]
+    return int(max(moments).timestamp()) if moments else None
+
+
+class ConditionalGetMixin:
+    """Вьюсет задаёт list_state() и object_state(pk): кортежи значений,
+    меняющиеся вместе с ответом. None из object_state - записи нет."""
+
+    def list_state(self):
+        raise ImproperlyConfigured(f'{type(self).__name__} должен определить list_state()')
+
+    def object_state(self, pk):
+        raise ImproperlyConfigured(f'{type(self).__name__} должен определить object_state()')
+
+    def validators(self, state, *scope):
+        """scope - то, от чего ещё зависит ответ (для списков - пользователь)"""
+        return make_etag(self.request.get_full_path(), state, *scope), last_modified(state)
+
+    def not_modified(self, etag, modified):
+        return get_conditional_response(self.request, etag=etag, last_modified=modified)
+
+    def with_validators(self, response, etag, modified):
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if modified:
+                response['Last-Modified'] = http_date(modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, modified = self.validators(self.list_state(), self.request.user.pk)
+        return self.not_modified(etag, modified) or self.with_validators(
+            super().list(request, *args, **kwargs), etag, modified
+        )
+
+    def lookup_state(self):
+        try:
+            return self.object_state(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def retrieve(self, request, *args, **kwargs):
+        state = self.lookup_state()
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag, modified = self.validators(state)
+        return self.not_modified(etag, modified) or self.with_validators(
+            super().retrieve(request, *args, **kwargs), etag, modified
+        )
@@ -0,0 +1,87 @@
+"""Буфер просмотров альбомов: просмотр не пишет в БД синхронно.
+
+Счётчики копятся в памяти процесса и раз в VIEW_COUNT_FLUSH_SECONDS
+сбрасываются фоновым потоком одним UPDATE ... CASE на пачку альбомов.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, Value, When
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+
+
+class ViewCounter:
+    def __init__(self):
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, album_id):
+        with self._lock:
+            self._pending[album_id] += 1
+        self._ensure_flusher()
+
+    def pending(self, album_id):
+        """Просмотры, ещё не попавшие в БД"""
+        return self._pending.get(album_id, 0)
+
+    def flush(self):
+        """Пишет накопленное в БД, при ошибке возвращает счётчики в буфер"""
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+        if not batch:
+            return 0
+
+        from . import caching
+        from .models import Album
+
+        items = list(batch.items())
+        for start in range(0, len(items), FLUSH_BATCH_SIZE):
+            chunk = items[start:start + FLUSH_BATCH_SIZE]
+            try:
+                Album.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                    views_count=F('views_count') + Case(
+                        *[When(pk=pk, then=Value(count)) for pk, count in chunk],
+                        default=Value(0),
+                    )
+                )
+            except Exception:
+                logger.exception('Не удалось записать просмотры альбомов')
+                with self._lock:
+                    for pk, count in items[start:]:
+                        self._pending[pk] += count
+                return start
+            # В кэше ответа альбома просмотры из БД, они только что изменились
+            caching.invalidate_albums(pk for pk, _ in chunk)
+        return len(items)
+
+    def _ensure_flusher(self):
+        # После fork (gunicorn --preload) поток родителя в дочернем процессе не живёт
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='album-views-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.VIEW_COUNT_FLUSH_SECONDS)
+            close_old_connections()
+            self.flush()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
@@ -0,0 +1,98 @@
+"""Удаление альбомов в два шага.
+
+tombstone_album() в запросе только ставит deleted_at (один UPDATE):
+альбом пропадает из Album.objects, а значит из всех списков и поиска.
+purge_album() в фоне удаляет фото и страницы пачками по
+ALBUM_PURGE_BATCH_SIZE, после коммита каждой пачки стирает их файлы
+из хранилища и в конце удаляет сам альбом.
+"""
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from . import caching, events, fragments, sync
+from .models import Album, AlbumPage, AlbumTemplate, ChangeLog, Photo, PhotoEdit
+from .tasks import background
+
+logger = logging.getLogger(__name__)
+
+# Все поля с файлами: файл стираем, только если на него больше никто не ссылается
+# (страницы, например, делят thumbnail с шаблоном)
+FILE_FIELDS = [
+    (Photo, 'image'),
+    (AlbumPage, 'thumbnail'),
+    (AlbumTemplate, 'thumbnail'),
+]
+
+
+def tombstone_album(album):
+    album.deleted_at = timezone.now()
+    Album.all_objects.filter(pk=album.pk).update(deleted_at=album.deleted_at)
+    caching.invalidate_albums([album.pk])
+    fragments.bump_users([album.user_id])
+    sync.record(album.user_id, ChangeLog.KIND_ALBUM, [album.pk], deleted=True)
+    events.notify('album_deleted', album.pk, album.user_id)
+    transaction.on_commit(lambda: background.submit(purge_album, album.pk))
+
+
+def _collect_and_delete(objs):
+    if objs:
+        collector = Collector(using=router.db_for_write(type(objs[0])))
+        collector.collect(objs)
+        collector.delete()
+
+
+@transaction.atomic
+def delete_photos(photos):
+    """Массовое удаление фото (photos - с загруженным album). Правки и фото
+    удаляются пачками с уже загруженными связями, чтобы сигналы не ходили
+    в БД за каждой строкой; файлы стираются в фоне после коммита"""
+    with sync.batched():
+        _collect_and_delete(list(PhotoEdit.objects.filter(photo__in=photos).select_related('photo__album')))
+        _collect_and_delete(photos)
+    names = [photo.image.name for photo in photos]
+    transaction.on_commit(lambda: background.submit(unlink_files, names))
+
+
+def unlink_files(names):
+    """Стирает файлы, на которые не ссылается ни одна строка FILE_FIELDS"""
+    names = {name for name in names if name}
+    for model, field in FILE_FIELDS:
+        if not names:
+            break
+        names -= set(
+            model._base_manager.filter(**{f'{field}__in': names}).values_list(field, flat=True)
+        )
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning('Не удалось удалить файл %s', name, exc_info=True)
+    return len(names)
+
+
+def _purge_batches(model, field, album_id, batch_size):
+    while True:
+        batch = list(
+            model.objects.filter(album_id=album_id).order_by('pk').values_list('pk', field)[:batch_size]
+        )
+        if not batch:
+            return
+        with transaction.atomic(), sync.batched():
+            model.objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+        unlink_files(name for _, name in batch)
+
+
+def purge_album(album_id, batch_size=None):
+    """Окончательно удаляет альбом, помеченный tombstone_album()"""
+    batch_size = batch_size or settings.ALBUM_PURGE_BATCH_SIZE
+    if not Album.all_objects.filter(pk=album_id, deleted_at__isnull=False).exists():
+        return False
+    _purge_batches(Photo, 'image', album_id, batch_size)
+    _purge_batches(AlbumPage, 'thumbnail', album_id, batch_size)
+    Album.all_objects.filter(pk=album_id).delete()
+    return True
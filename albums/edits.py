@@ -0,0 +1,131 @@
+"""История редактирований фото: указатель на текущую правку и сжатие старых.
+
+Каждая правка - строка PhotoEdit. Photo.current_edit и Photo.edits_count
+обновляются при создании правки (signals.py), поэтому список фото читает
+одну правку на фото. Старые строки compact_edit_history() сворачивает
+в PhotoEditHistory: полное состояние base плюс дельты только с изменёнными
+полями. Дельты старше EDIT_HISTORY_RETENTION_DAYS и сверх
+EDIT_HISTORY_MAX_DELTAS вливаются в base.
+
+apply_preset() применяет EditPreset к пачке фото: правки одной вставкой,
+указатели текущей правки - одним UPDATE, журнал sync - одной вставкой,
+без сигналов на каждую строку.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import sync
+from .models import ChangeLog, Photo, PhotoEdit, PhotoEditHistory
+
+EDIT_FIELDS = ('filters_applied', 'crop_data', 'brightness', 'contrast', 'saturation')
+PRESET_FIELDS = ('filters_applied', 'brightness', 'contrast', 'saturation')
+
+
+def edit_state(edit):
+    return {field: getattr(edit, field) for field in EDIT_FIELDS}
+
+
+def diff(old, new):
+    return {field: value for field, value in new.items() if old.get(field) != value}
+
+
+def replay(history):
+    """Состояния из сжатой истории, от старых к новым: [(время, состояние)]"""
+    if history.base_at is None:
+        return []
+    state = dict(history.base)
+    states = [(history.base_at, dict(state))]
+    for delta in history.deltas:
+        state.update(delta['set'])
+        states.append((parse_datetime(delta['at']), dict(state)))
+    return states
+
+
+def record_edit(edit):
+    """Новая правка становится текущей"""
+    Photo.objects.filter(pk=edit.photo_id).update(
+        current_edit=edit, edits_count=F('edits_count') + 1, updated_at=timezone.now()
+    )
+
+
+@transaction.atomic
+def apply_preset(preset, photo_ids):
+    """Новая правка из пресета для каждого фото (фото владельца пресета).
+    Кэш альбомов сбрасывает вызывающий"""
+    values = {field: getattr(preset, field) for field in PRESET_FIELDS}
+    created = PhotoEdit.objects.bulk_create(PhotoEdit(photo_id=pk, **values) for pk in photo_ids)
+    if created:
+        Photo.objects.filter(pk__in=[edit.photo_id for edit in created]).update(
+            current_edit=Case(*(When(pk=edit.photo_id, then=edit.pk) for edit in created)),
+            edits_count=F('edits_count') + 1,
+            updated_at=timezone.now(),
+        )
+        with sync.batched():
+            sync.record(preset.user_id, ChangeLog.KIND_EDIT, [edit.pk for edit in created])
+            sync.record(preset.user_id, ChangeLog.KIND_PHOTO, [edit.photo_id for edit in created])
+    return created
+
+
+def discard_edit(edit):
+    """Удаляет правку; если она была текущей - текущей становится предыдущая"""
+    with transaction.atomic():
+        photo_id = edit.photo_id
+        edit.delete()
+        previous = PhotoEdit.objects.filter(photo_id=photo_id).order_by('-created_at', '-pk').first()
+        Photo.objects.filter(pk=photo_id).update(
+            current_edit=previous, edits_count=F('edits_count') - 1, updated_at=timezone.now()
+        )
+
+
+def _apply_retention(history, now):
+    cutoff = now - timedelta(days=settings.EDIT_HISTORY_RETENTION_DAYS)
+    deltas = history.deltas
+    while deltas and (
+        len(deltas) > settings.EDIT_HISTORY_MAX_DELTAS or parse_datetime(deltas[0]['at']) < cutoff
+    ):
+        delta = deltas.pop(0)
+        history.base.update(delta['set'])
+        history.base_at = parse_datetime(delta['at'])
+
+
+@transaction.atomic
+def compact_photo(photo_id, keep, now=None):
+    """Сворачивает все правки фото, кроме keep последних. Возвращает число свёрнутых"""
+    now = now or timezone.now()
+    edits = list(PhotoEdit.objects.filter(photo_id=photo_id).order_by('-created_at', '-pk'))
+    old = edits[keep:][::-1]
+    if not old:
+        return 0
+
+    history, _ = PhotoEditHistory.objects.get_or_create(photo_id=photo_id)
+    states = replay(history)
+    state = states[-1][1] if states else None
+    for edit in old:
+        new_state = edit_state(edit)
+        if state is None:
+            history.base, history.base_at = new_state, edit.created_at
+        else:
+            history.deltas.append({'at': edit.created_at.isoformat(), 'set': diff(state, new_state)})
+        state = new_state
+    _apply_retention(history, now)
+    history.save()
+
+    PhotoEdit.objects.filter(pk__in=[edit.pk for edit in old]).delete()
+    return len(old)
+
+
+def compact_edit_history(keep=None):
+    """Проходит по фото, у которых живых правок больше keep"""
+    keep = max(keep or settings.EDIT_HISTORY_KEEP, 1)  # текущую правку не сворачиваем
+    photo_ids = (
+        PhotoEdit.objects.order_by().values('photo')
+        .annotate(live=Count('pk')).filter(live__gt=keep)
+        .values_list('photo', flat=True)
+    )
+    now = timezone.now()
+    return sum(compact_photo(photo_id, keep, now) for photo_id in list(photo_ids))
@@ -0,0 +1,150 @@
+"""Живые обновления через SSE: GET /events/albums/<id>/ и /events/me/.
+
+Брокер - в памяти процесса. Подписчик - asyncio.Queue в цикле событий
+ASGI-воркера, соединение в простое - это ожидающая корутина без потока,
+так что один воркер держит тысячи подключений. publish() можно звать из
+любого потока (сигналы в синхронных вьюхах): событие попадает в очередь
+через call_soon_threadsafe. notify() публикует после коммита в канал
+альбома и канал владельца.
+
+События между процессами не ходят: схема рассчитана на один
+ASGI-воркер (uvicorn app.asgi:application), через который идут и
+запросы на запись. Под WSGI бесконечный поток занял бы воркер целиком,
+поэтому SSE включается настройкой SSE_ENABLED (по умолчанию выключено),
+а под WSGI вьюхи отвечают 204 и страницы не подписываются.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+
+def album_channel(album_id):
+    return f'album:{album_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    def __init__(self, loop, channels, queue_size):
+        self.loop = loop
+        self.channels = channels
+        self.queue = asyncio.Queue(queue_size)
+        self.overflow = False
+
+    def offer(self, event):
+        # Выполняется в цикле событий подписчика
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать - вместо потерянных событий он получит reset
+            self.overflow = True
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channels, queue_size=None):
+        subscription = Subscription(
+            asyncio.get_running_loop(), tuple(channels), queue_size or settings.SSE_QUEUE_SIZE
+        )
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def has_subscribers(self, channels):
+        with self._lock:
+            return any(channel in self._channels for channel in channels)
+
+    def publish(self, channels, event):
+        with self._lock:
+            # Подписанный на несколько каналов получает событие один раз
+            subscribers = set().union(*(self._channels.get(channel, ()) for channel in channels))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:  # цикл уже закрыт
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+broker = Broker()
+
+
+def notify(event_type, album_id, user_id, **data):
+    """Событие для страниц альбома и его владельца - после коммита.
+    Без подписчиков в процессе (в том числе под WSGI) ничего не делает"""
+    channels = [album_channel(album_id), user_channel(user_id)]
+    if not broker.has_subscribers(channels):
+        return
+    event = {'type': event_type, 'album': album_id, **data}
+    transaction.on_commit(lambda: broker.publish(channels, event))
+
+
+def format_event(event):
+    return f'data: {json.dumps(event, separators=(",", ":"))}\n\n'
+
+
+class EventStream:
+    """Тело ответа SSE. close() Django вызывает по окончании ответа -
+    подписка снимается, даже если генератор так и не закрыли"""
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.subscription = None
+
+    def __aiter__(self):
+        return self._events()
+
+    def close(self):
+        if self.subscription is not None:
+            broker.unsubscribe(self.subscription)
+
+    async def _events(self):
+        self.subscription = subscription = broker.subscribe(self.channels)
+        try:
+            yield f'retry: {settings.SSE_RETRY_MS}\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Комментарий не даёт прокси закрыть соединение в простое
+                    yield ': ping\n\n'
+                    continue
+                # Всплеск (пересборка страниц альбома) - одной порцией без повторов
+                events = [event]
+                while not subscription.queue.empty():
+                    event = subscription.queue.get_nowait()
+                    if event not in events:
+                        events.append(event)
+                if subscription.overflow:
+                    subscription.overflow = False
+                    events = [{'type': 'reset'}]
+                yield ''.join(format_event(event) for event in events)
+        finally:
+            broker.unsubscribe(subscription)
+
+
+def event_stream(*channels):
+    response = StreamingHttpResponse(EventStream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx не должен копить поток
+    return response
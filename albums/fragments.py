@@ -0,0 +1,79 @@
+"""Кэш HTML-фрагментов для HTMX (albums/partials/*.html).
+
+Фрагмент кэшируется по имени, пользователю и его версии. Версия - метка
+в общем кэше; сигналы (signals.py) после коммита ставят новую при
+изменении альбомов, фото и данных пользователя, так что старые записи
+просто перестают читаться и вытесняются по FRAGMENT_CACHE_SECONDS.
+
+Ответ несёт ETag по ключу фрагмента: повторный hx-get того же блока
+получает 304 без рендера. Если HX-Trigger запроса (id элемента, который
+вызвал запрос) есть в revalidate_on, кэш обходится и фрагмент
+перерисовывается заново.
+
+CSRF-токен в кэш не попадает: при рендере вместо него подставляется
+метка, которая заменяется токеном текущего запроса.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .conditional import make_etag
+
+CSRF_PLACEHOLDER = 'albums-fragment-csrf-token'
+
+
+def version_key(user_id):
+    return f'albums:fragments:version:{user_id}'
+
+
+def user_version(user_id):
+    version = cache.get(version_key(user_id))
+    if version is None:
+        cache.add(version_key(user_id), uuid.uuid4().hex, None)
+        version = cache.get(version_key(user_id))
+    return version
+
+
+def bump_users(user_ids):
+    """Фрагменты пользователей устарели - новая версия после коммита"""
+    user_ids = {pk for pk in user_ids if pk is not None}
+    if user_ids:
+        transaction.on_commit(
+            lambda: cache.set_many({version_key(pk): uuid.uuid4().hex for pk in user_ids}, None)
+        )
+
+
+def fragment_key(name, user_id, *scope):
+    return ':'.join(['albums:fragment', name, str(user_id), user_version(user_id), *map(str, scope)])
+
+
+def render_fragment(request, name, template_name, get_context, scope=(), revalidate_on=()):
+    """HTML фрагмента из кэша или рендер get_context().
+    scope - то, от чего ещё зависит фрагмент, кроме данных пользователя"""
+    key = fragment_key(name, request.user.pk, *scope)
+    etag = make_etag(key)
+    revalidate = request.headers.get('HX-Trigger') in revalidate_on
+    if not revalidate:
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+    html = None if revalidate else cache.get(key)
+    if html is None:
+        context = dict(get_context(), csrf_token=CSRF_PLACEHOLDER)
+        html = render_to_string(template_name, context, request)
+        cache.set(key, html, settings.FRAGMENT_CACHE_SECONDS)
+
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    response = HttpResponse(html)
+    response['ETag'] = etag
+    # Браузер обязан переспрашивать: версия могла смениться
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
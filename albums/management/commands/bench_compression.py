@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from albums.models import Album
+from app.middleware import COMPRESSORS, compress
+
+
+class Command(BaseCommand):
+    help = 'Байты на проводе и время CPU на сжатие ответов API (app.middleware.CompressionMiddleware)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--album', type=int, help='Альбом для detail (по умолчанию публичный с наибольшим числом фото)')
+        parser.add_argument('--repeat', type=int, default=50, help='Сколько раз сжимать каждый ответ')
+
+    def handle(self, *args, **options):
+        album_id = options['album'] or (
+            Album.objects.public().annotate(n=Count('photos')).order_by('-n')
+            .values_list('pk', flat=True).first()
+        )
+        if album_id is None:
+            raise CommandError('Нет публичных альбомов: укажите --album')
+
+        endpoints = [
+            ('album-list', reverse('albums:album-list')),
+            ('album-detail', reverse('albums:album-detail', args=[album_id])),
+            ('photo-list', reverse('albums:photo-list') + f'?album={album_id}'),
+            ('template-list', reverse('albums:template-list')),
+        ]
+        client = Client()
+
+        header = f"{'':16}{'байт':>10}"
+        for encoding in COMPRESSORS:
+            header += f"{encoding:>10}{'%':>6}{'мс':>8}"
+        self.stdout.write(header)
+
+        for name, url in endpoints:
+            response = client.get(url, HTTP_ACCEPT_ENCODING='identity')
+            if response.status_code != 200:
+                self.stdout.write(f'{name:16}HTTP {response.status_code}')
+                continue
+            body = response.content
+            row = f'{name:16}{len(body):>10}'
+            for encoding in COMPRESSORS:
+                started = time.process_time()
+                for _ in range(options['repeat']):
+                    compressed = compress(body, encoding)
+                elapsed = (time.process_time() - started) / options['repeat'] * 1000
+                row += f'{len(compressed):>10}{len(compressed) / len(body) * 100:>6.0f}{elapsed:>8.2f}'
+            self.stdout.write(row)
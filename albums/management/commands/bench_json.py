@@ -0,0 +1,57 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from albums import renderers
+from albums.models import Album, Photo
+from albums.serializers import AlbumDetailSerializer, AlbumListSerializer, PhotoSerializer
+
+
+class Command(BaseCommand):
+    help = 'Рендер и разбор JSON ответов API: стандартный json DRF против orjson (albums/renderers.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--albums', type=int, default=100, help='Альбомов в списке')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError('orjson не установлен: сравнивать не с чем')
+        album = Album.objects.annotate(n=Count('photos')).order_by('-n').first()
+        if album is None:
+            raise CommandError('В базе нет альбомов')
+
+        payloads = [
+            ('album-list', AlbumListSerializer(
+                Album.objects.select_related('user', 'layout_template')[:options['albums']], many=True
+            ).data),
+            ('album-detail', AlbumDetailSerializer(album).data),
+            ('photo-list', PhotoSerializer(
+                Photo.objects.filter(album=album).select_related('current_edit'), many=True
+            ).data),
+        ]
+        pairs = [
+            ('json', JSONRenderer(), JSONParser()),
+            ('orjson', renderers.FastJSONRenderer(), renderers.FastJSONParser()),
+        ]
+
+        self.stdout.write(f"{'':14}{'байт':>9}" + ''.join(f'{name + " мс":>16}{"разбор мс":>11}' for name, *_ in pairs))
+        for name, data in payloads:
+            row = f'{name:14}'
+            for _, renderer, parser in pairs:
+                render_ms, body = self.measure(lambda: renderer.render(data), options['repeat'])
+                parse_ms, _ = self.measure(lambda: parser.parse(io.BytesIO(body)), options['repeat'])
+                if len(row) == 14:
+                    row += f'{len(body):>9}'
+                row += f'{render_ms:>16.3f}{parse_ms:>11.3f}'
+            self.stdout.write(row)
+
+    def measure(self, func, repeat):
+        started = time.process_time()
+        for _ in range(repeat):
+            result = func()
+        return (time.process_time() - started) / repeat * 1000, result
@@ -0,0 +1,95 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction, OperationalError
+
+
+CONFIGS = [
+    ('sqlite3 по умолчанию', 'django.db.backends.sqlite3', {}),
+    ('app.db.sqlite3 (WAL)', 'app.db.sqlite3', {}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Пропускная способность читателей/писателей SQLite: стандартный бэкенд против app.db.sqlite3'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = []
+            for i, (label, engine, db_options) in enumerate(CONFIGS):
+                alias = f'bench_{i}'
+                self.register(alias, engine, Path(tmp) / f'{alias}.sqlite3', db_options)
+                rows.append((label, self.run(alias, options)))
+                connections[alias].close()
+
+        self.stdout.write(f"{'':24}{'запись/с':>10}{'чтение/с':>10}{'locked':>8}")
+        for label, result in rows:
+            self.stdout.write(
+                f"{label:24}{result['writes']:>10.0f}{result['reads']:>10.0f}{result['errors']:>8}"
+            )
+
+    def register(self, alias, engine, name, db_options):
+        databases = connections.configure_settings({
+            'default': {'ENGINE': 'django.db.backends.dummy'},
+            alias: {'ENGINE': engine, 'NAME': str(name), 'OPTIONS': db_options},
+        })
+        connections.settings[alias] = databases[alias]
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE photo (id INTEGER PRIMARY KEY, album_id INTEGER, title TEXT)')
+            cursor.execute('CREATE INDEX photo_album ON photo (album_id)')
+
+    def run(self, alias, options):
+        counters = {'writes': 0, 'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def count(key):
+            with lock:
+                counters[key] += 1
+
+        def writer(n):
+            # Как загрузка фото: прочитать лимит, затем вставить в одной транзакции
+            while time.monotonic() < deadline:
+                try:
+                    with transaction.atomic(using=alias):
+                        with connections[alias].cursor() as cursor:
+                            cursor.execute('SELECT COUNT(*) FROM photo WHERE album_id = %s', [n])
+                            cursor.execute(
+                                'INSERT INTO photo (album_id, title) VALUES (%s, %s)', [n, 'x' * 64]
+                            )
+                    count('writes')
+                except OperationalError:
+                    count('errors')
+            connections[alias].close()
+
+        def reader(n):
+            while time.monotonic() < deadline:
+                try:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT id, title FROM photo WHERE album_id = %s LIMIT 20', [n % 4])
+                        cursor.fetchall()
+                    count('reads')
+                except OperationalError:
+                    count('errors')
+            connections[alias].close()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(n,)) for n in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            'writes': counters['writes'] / options['seconds'],
+            'reads': counters['reads'] / options['seconds'],
+            'errors': counters['errors'],
+        }
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from albums.edits import compact_edit_history
+
+
+class Command(BaseCommand):
+    help = 'Сворачивает старые правки фото в сжатую историю (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=None, help='Сколько последних правок оставить строками')
+
+    def handle(self, *args, **options):
+        count = compact_edit_history(options['keep'])
+        self.stdout.write(self.style.SUCCESS(f'Свёрнуто правок: {count}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from albums.trending import compute_trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг популярных альбомов (запускать по cron раз в несколько минут)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=None, help='Сколько альбомов держать в рейтинге')
+
+    def handle(self, *args, **options):
+        count = compute_trending(options['size'])
+        self.stdout.write(self.style.SUCCESS(f'В рейтинге альбомов: {count}'))
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from albums.media_gc import MEDIA_ROOTS, delete_throttled, find_orphans
+
+
+class Command(BaseCommand):
+    help = 'Удаляет медиафайлы, на которые не ссылается ни одна запись (запускать по cron раз в сутки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только отчёт, ничего не удалять')
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Не трогать файлы моложе этого возраста'
+        )
+        parser.add_argument('--root', action='append', dest='roots', help='Каталог в хранилище (можно несколько)')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--pause', type=float, default=1.0, help='Секунд между пачками удаления')
+
+    def handle(self, *args, **options):
+        stats = {}
+        orphans = find_orphans(
+            default_storage,
+            roots=options['roots'] or MEDIA_ROOTS,
+            grace=timedelta(hours=options['grace_hours']),
+            stats=stats,
+        )
+
+        if options['dry_run']:
+            count = size = 0
+            for name in orphans:
+                count += 1
+                size += default_storage.size(name)
+                if options['verbosity'] > 1:
+                    self.stdout.write(name)
+            self.stdout.write(
+                f"Просмотрено файлов: {stats['scanned']}, моложе grace: {stats['recent']}, "
+                f"к удалению: {count} ({size / 1024 / 1024:.1f} МБ)"
+            )
+            return
+
+        deleted = delete_throttled(orphans, options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Просмотрено файлов: {stats['scanned']}, моложе grace: {stats['recent']}, удалено: {deleted}"
+        ))
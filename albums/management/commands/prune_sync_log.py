@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from albums.sync import prune
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые строки журнала изменений /api/sync/ (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Сколько дней хранить (по умолчанию SYNC_LOG_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        count = prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено строк журнала: {count}'))
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from albums.deletion import purge_album
+from albums.models import Album
+
+
+class Command(BaseCommand):
+    help = 'Доудаляет альбомы, помеченные на удаление, если фоновая задача не успела (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=10,
+            help='Минут с момента пометки: более свежие ещё может удалять фоновый поток'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+        album_ids = list(
+            Album.all_objects.filter(deleted_at__lte=cutoff).values_list('pk', flat=True)
+        )
+        purged = sum(purge_album(album_id) for album_id in album_ids)
+        self.stdout.write(self.style.SUCCESS(f'Удалено альбомов: {purged}'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from albums import search
+from albums.models import Album, SearchTrigram, User
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает триграммный индекс нечёткого поиска'
+
+    def handle(self, *args, **options):
+        SearchTrigram.objects.all().delete()
+
+        rows = []
+        albums = Album.objects.filter(is_public=True).values_list('pk', 'title')
+        for pk, title in albums.iterator():
+            rows.extend(
+                SearchTrigram(kind=SearchTrigram.KIND_ALBUM, trigram=t, object_id=pk)
+                for t in search.trigrams(title)
+            )
+        for pk, username in User.objects.values_list('pk', 'username').iterator():
+            rows.extend(
+                SearchTrigram(kind=SearchTrigram.KIND_USER, trigram=t, object_id=pk)
+                for t in search.trigrams(username)
+            )
+        SearchTrigram.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано триграмм: {len(rows)}'))
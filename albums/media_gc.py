@@ -0,0 +1,97 @@
+"""Сборщик осиротевших медиафайлов (manage.py media_gc).
+
+Имена файлов из хранилища и ссылки из БД читаются двумя потоками,
+отсортированными одинаково (по кодовым точкам, как BINARY-сравнение
+в SQLite), и сравниваются merge-join'ом: в памяти не бывает ни полного
+списка файлов, ни множества всех ссылок.
+"""
+import heapq
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .deletion import FILE_FIELDS, unlink_files
+
+# Каталоги, куда пишут Photo.image и AlbumPage.thumbnail
+MEDIA_ROOTS = ('photos', 'album_pages/thumbnails')
+
+
+def storage_names(storage, path):
+    """Файлы под path в порядке сортировки полных имён.
+
+    Каталог сортируется как "имя/": все его файлы начинаются с этого
+    префикса, поэтому обход в глубину даёт глобально отсортированный поток.
+    """
+    try:
+        dirs, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    entries = [(f'{path}/{name}', False) for name in files]
+    entries += [(f'{path}/{name}/', True) for name in dirs]
+    for name, is_dir in sorted(entries):
+        if is_dir:
+            yield from storage_names(storage, name[:-1])
+        else:
+            yield name
+
+
+def referenced_names(chunk_size=2000):
+    """Все имена файлов из FILE_FIELDS, отсортированные и без повторов"""
+    streams = [
+        model._base_manager.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        .order_by(field).values_list(field, flat=True).iterator(chunk_size=chunk_size)
+        for model, field in FILE_FIELDS
+    ]
+    previous = None
+    for name in heapq.merge(*streams):
+        if name != previous:
+            yield name
+            previous = name
+
+
+def unreferenced(files, references):
+    """Merge-join двух отсортированных потоков: файлы без ссылки"""
+    references = iter(references)
+    current = next(references, None)
+    for name in files:
+        while current is not None and current < name:
+            current = next(references, None)
+        if name != current:
+            yield name
+
+
+def find_orphans(storage, roots=MEDIA_ROOTS, grace=timedelta(hours=24), stats=None):
+    """Осиротевшие файлы старше grace: свежий файл может принадлежать
+    загрузке, чья транзакция ещё не закоммичена"""
+    stats = stats if stats is not None else {}
+    stats.update(scanned=0, recent=0)
+
+    def counted(names):
+        for name in names:
+            stats['scanned'] += 1
+            yield name
+
+    cutoff = timezone.now() - grace
+    files = heapq.merge(*(storage_names(storage, root.strip('/')) for root in sorted(roots)))
+    for name in unreferenced(counted(files), referenced_names()):
+        if storage.get_modified_time(name) > cutoff:
+            stats['recent'] += 1
+            continue
+        yield name
+
+
+def delete_throttled(names, batch_size=100, pause=1.0):
+    """Удаляет пачками с паузой между ними, чтобы не забивать диск и БД.
+    unlink_files перепроверяет ссылки перед удалением каждой пачки"""
+    deleted = 0
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) >= batch_size:
+            deleted += unlink_files(batch)
+            batch = []
+            time.sleep(pause)
+    if batch:
+        deleted += unlink_files(batch)
+    return deleted
@@ -0,0 +1,58 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:42
+
+import re
+
+from django.db import migrations, models
+
+# Копия albums.search.normalize/trigrams на момент миграции: результат
+# миграции не должен зависеть от того, как потом поменяется search.py
+_non_word = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def trigrams(text):
+    text = _non_word.sub(' ', (text or '').lower().replace('ё', 'е')).strip()
+    result = set()
+    for word in text.split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def build_index(apps, schema_editor):
+    Album = apps.get_model('albums', 'Album')
+    User = apps.get_model('albums', 'User')
+    SearchTrigram = apps.get_model('albums', 'SearchTrigram')
+
+    rows = []
+    for pk, title in Album.objects.filter(is_public=True).values_list('pk', 'title').iterator():
+        rows.extend(SearchTrigram(kind='album', trigram=t, object_id=pk) for t in trigrams(title))
+    for pk, username in User.objects.values_list('pk', 'username').iterator():
+        rows.extend(SearchTrigram(kind='user', trigram=t, object_id=pk) for t in trigrams(username))
+    SearchTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0005_remove_albumpage_background_color_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('album', 'Альбом'), ('user', 'Пользователь')], max_length=5)),
+                ('trigram', models.CharField(max_length=3)),
+                ('object_id', models.PositiveBigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Триграмма поиска',
+                'verbose_name_plural': 'Триграммы поиска',
+                'indexes': [models.Index(fields=['object_id', 'kind'], name='albums_trgm_object_idx')],
+                'unique_together': {('kind', 'trigram', 'object_id')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
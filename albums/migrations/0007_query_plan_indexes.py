@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0006_searchtrigram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['is_public', 'created_at'], name='albums_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['user', 'created_at'], name='albums_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['album', 'order_index', 'uploaded_at'], name='albums_photo_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photoedit',
+            index=models.Index(fields=['photo', 'created_at'], name='albums_photoedit_photo_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0007_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0008_album_views_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingAlbum',
+            fields=[
+                ('album', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='albums.album')),
+                ('rank', models.PositiveIntegerField(unique=True)),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Популярный альбом',
+                'verbose_name_plural': 'Популярные альбомы',
+                'ordering': ['rank'],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_current_edit(apps, schema_editor):
+    Photo = apps.get_model('albums', 'Photo')
+    PhotoEdit = apps.get_model('albums', 'PhotoEdit')
+
+    edits = PhotoEdit.objects.filter(photo=OuterRef('pk'))
+    Photo.objects.update(
+        current_edit=Subquery(edits.order_by('-created_at', '-pk').values('pk')[:1]),
+        edits_count=Coalesce(
+            Subquery(edits.order_by().values('photo').annotate(n=Count('pk')).values('n')), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0009_trendingalbum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoEditHistory',
+            fields=[
+                ('photo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='edit_history', serialize=False, to='albums.photo')),
+                ('base', models.JSONField(default=dict)),
+                ('base_at', models.DateTimeField(blank=True, null=True)),
+                ('deltas', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'История редактирований',
+                'verbose_name_plural': 'История редактирований',
+            },
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='current_edit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='albums.photoedit'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='edits_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_current_edit, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:54
+
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0010_photo_current_edit'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='album',
+            options={'base_manager_name': 'all_objects', 'ordering': ['-created_at'], 'verbose_name': 'Фотоальбом', 'verbose_name_plural': 'Фотоальбомы'},
+        ),
+        migrations.AlterModelManagers(
+            name='album',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='album',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='albums_deleted_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='album',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('user', 'title'), name='albums_album_user_title_uniq'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:20
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0012_photo_albumpage_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EditPreset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('filters_applied', models.JSONField(default=dict)),
+                ('brightness', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(-100), django.core.validators.MaxValueValidator(100)])),
+                ('contrast', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(-100), django.core.validators.MaxValueValidator(100)])),
+                ('saturation', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(-100), django.core.validators.MaxValueValidator(100)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edit_presets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Пресет правки',
+                'verbose_name_plural': 'Пресеты правок',
+                'ordering': ['name'],
+                'unique_together': {('user', 'name')},
+            },
+        ),
+    ]
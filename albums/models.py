@@ -1,10 +1,14 @@
 from django.db import models
+from django.db.models import Count, Q, Sum
 from django.contrib.auth.models import AbstractUser, \
     BaseUserManager
 from django.core.validators import FileExtensionValidator, MaxValueValidator, MinValueValidator
 from django.utils.html import strip_tags
 from django.core.exceptions import ValidationError
 
+from . import template_css
+from .registry import registry
+
 # Create your models here.
 
 class UserManager(BaseUserManager):
@@ -19,6 +23,7 @@ class UserManager(BaseUserManager):
                           last_name=last_name, username=username, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
+        return user
 
 
     def create_superuser(self, email, first_name, last_name, username, password=None, **extra_fields):
@@ -51,6 +56,12 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    def get_session_auth_hash(self):
+        # Снимок из albums/backends.py несёт готовый хэш: не читаем отложенный password
+        if 'password' in self.get_deferred_fields() and getattr(self, '_session_auth_hash', None):
+            return self._session_auth_hash
+        return super().get_session_auth_hash()
     
     def clean(self):
         for field in ['first_name', 'last_name', 'email', 'username']:
@@ -86,6 +97,37 @@ class AlbumTemplate(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def css_url(self):
+        """Неизменяемый URL стилей, меняется вместе с css_styles"""
+        return template_css.css_url(self)
+
+
+
+class AlbumQuerySet(models.QuerySet):
+    def public(self):
+        # is_public=True SQLite получает как голое "WHERE is_public", а по такому
+        # условию индекс не используется; IN (1) идёт по albums_public_created_idx
+        return self.filter(is_public__in=[True])
+
+    def visible_to(self, user):
+        """Свои альбомы + публичные"""
+        if not user.is_authenticated:
+            return self.public()
+        return self.filter(Q(user=user) | Q(is_public__in=[True]))
+
+    def with_photo_stats(self):
+        """Число фото и их суммарный размер одним запросом (для списков альбомов)"""
+        return self.annotate(
+            photos_total=Count('photos'),
+            photos_size=Sum('photos__file_size'),
+        )
+
+
+class AlbumManager(models.Manager.from_queryset(AlbumQuerySet)):
+    """Альбомы, помеченные на удаление (deleted_at), не видны нигде, кроме all_objects"""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Album(models.Model):
@@ -110,10 +152,33 @@ class Album(models.Model):
         blank=True,
         related_name='albums'
     )
+    # Пишется пачками из albums.counters, не через save()
+    views_count = models.PositiveIntegerField(default=0)
+    # Надгробие: альбом скрыт сразу, строки и файлы удаляет albums.deletion в фоне
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AlbumManager()
+    all_objects = AlbumQuerySet.as_manager()
     
     class Meta:
-        unique_together = ('user', 'title')
+        # photo.album и каскады должны видеть и удалённые альбомы
+        base_manager_name = 'all_objects'
         ordering = ['-created_at']
+        constraints = [
+            # Название альбома, ждущего удаления, можно сразу занять снова
+            models.UniqueConstraint(
+                fields=['user', 'title'], condition=Q(deleted_at__isnull=True),
+                name='albums_album_user_title_uniq'
+            ),
+        ]
+        indexes = [
+            # Публичная лента и "свои + публичные" с сортировкой по дате
+            models.Index(fields=['is_public', 'created_at'], name='albums_public_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='albums_user_created_idx'),
+            models.Index(
+                fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='albums_deleted_idx'
+            ),
+        ]
         verbose_name = 'Фотоальбом'
         verbose_name_plural = 'Фотоальбомы'
     
@@ -123,7 +188,7 @@ class Album(models.Model):
     def save(self, *args, **kwargs):
         # Если шаблон не указан, автоматически ставим "Классический"
         if self.layout_template is None:
-            self.layout_template = AlbumTemplate.objects.filter(name="Классический").first()
+            self.layout_template = registry.default()
         super().save(*args, **kwargs)
 
     
@@ -162,12 +227,27 @@ class Photo(models.Model):
     title = models.CharField(max_length=200, blank=True)
     description = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Для ETag/Last-Modified (albums/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
     file_size = models.IntegerField(default=0)
     dimensions = models.CharField(max_length=20, blank=True)
     order_index = models.IntegerField(default=0)
+    # Активное редактирование и число правок: списку фото не нужна вся история
+    current_edit = models.ForeignKey(
+        'PhotoEdit',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    edits_count = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['order_index', 'uploaded_at']
+        indexes = [
+            # Фото альбома сразу в порядке сортировки
+            models.Index(fields=['album', 'order_index', 'uploaded_at'], name='albums_photo_order_idx'),
+        ]
         verbose_name = 'Фотография'
         verbose_name_plural = 'Фотографии'
     
@@ -194,6 +274,7 @@ class AlbumPage(models.Model):
 
     # Мини-превью страницы (можно использовать как фон)
     thumbnail = models.ImageField(upload_to='album_pages/thumbnails/', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('album', 'page_number')
@@ -219,6 +300,9 @@ class PhotoEdit(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['photo', 'created_at'], name='albums_photoedit_photo_idx'),
+        ]
         verbose_name = 'Редактирование фото'
         verbose_name_plural = 'Редактирования фото'
     
@@ -230,4 +314,130 @@ class PhotoEdit(models.Model):
         for field in ['brightness', 'contrast', 'saturation']:
             value = getattr(self, field)
             if not (-100 <= value <= 100):
-                raise ValidationError(f'{field} должен быть от -100 до 100')
\ No newline at end of file
+                raise ValidationError(f'{field} должен быть от -100 до 100')
+
+
+class PhotoEditHistory(models.Model):
+    """Сжатая история редактирований фото (см. albums/edits.py).
+
+    base - состояние на момент base_at, deltas - последующие правки
+    в виде [{'at': ..., 'set': {поле: значение}}] только с изменёнными полями.
+    """
+    photo = models.OneToOneField(Photo, on_delete=models.CASCADE, primary_key=True, related_name='edit_history')
+    base = models.JSONField(default=dict)
+    base_at = models.DateTimeField(null=True, blank=True)
+    deltas = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'История редактирований'
+        verbose_name_plural = 'История редактирований'
+
+    def __str__(self):
+        return f"History for photo {self.photo_id} ({len(self.deltas)} deltas)"
+
+
+class EditPreset(models.Model):
+    """Сохранённая правка пользователя, применяется к фото альбома целиком"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='edit_presets')
+    name = models.CharField(max_length=100)
+    filters_applied = models.JSONField(default=dict)
+    brightness = models.IntegerField(default=0, validators=[MinValueValidator(-100), MaxValueValidator(100)])
+    contrast = models.IntegerField(default=0, validators=[MinValueValidator(-100), MaxValueValidator(100)])
+    saturation = models.IntegerField(default=0, validators=[MinValueValidator(-100), MaxValueValidator(100)])
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        unique_together = ('user', 'name')
+        verbose_name = 'Пресет правки'
+        verbose_name_plural = 'Пресеты правок'
+
+    def __str__(self):
+        return self.name
+
+
+class ChangeLog(models.Model):
+    """Журнал изменений для GET /api/sync/ (albums/sync.py): id - курсор клиента.
+
+    user - владелец альбома. Без внешнего ключа в БД: строки об удалении
+    пишутся и при каскадном удалении самого пользователя.
+    """
+    KIND_ALBUM = 'album'
+    KIND_PHOTO = 'photo'
+    KIND_PAGE = 'page'
+    KIND_EDIT = 'edit'
+    KIND_CHOICES = [
+        (KIND_ALBUM, 'Альбом'),
+        (KIND_PHOTO, 'Фото'),
+        (KIND_PAGE, 'Страница'),
+        (KIND_EDIT, 'Правка'),
+    ]
+
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='albums_changelog_cursor_idx'),
+        ]
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id}{' deleted' if self.deleted else ''}"
+
+
+class SearchTrigram(models.Model):
+    """Триграмма для нечёткого поиска по названиям альбомов и никнеймам"""
+    KIND_ALBUM = 'album'
+    KIND_USER = 'user'
+    KIND_CHOICES = [
+        (KIND_ALBUM, 'Альбом'),
+        (KIND_USER, 'Пользователь'),
+    ]
+
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    trigram = models.CharField(max_length=3)
+    object_id = models.PositiveBigIntegerField()
+
+    class Meta:
+        # (kind, trigram, object_id) - покрывающий индекс для выборки кандидатов,
+        # (object_id, kind) - для переиндексации одного объекта (порядок колонок
+        # важен: индекс с kind впереди SQLite выбирает для GROUP BY и читает всё)
+        unique_together = ('kind', 'trigram', 'object_id')
+        indexes = [
+            models.Index(fields=['object_id', 'kind'], name='albums_trgm_object_idx'),
+        ]
+        verbose_name = 'Триграмма поиска'
+        verbose_name_plural = 'Триграммы поиска'
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} '{self.trigram}'"
+
+
+class TrendingAlbum(models.Model):
+    """Предрасчитанный рейтинг популярных альбомов (пересчитывает albums.trending)"""
+    album = models.OneToOneField(
+        Album,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending'
+    )
+    rank = models.PositiveIntegerField(unique=True)
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['rank']
+        verbose_name = 'Популярный альбом'
+        verbose_name_plural = 'Популярные альбомы'
+
+    def __str__(self):
+        return f"#{self.rank} {self.album_id} ({self.score:.3f})"
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TrendingCursorPagination(CursorPagination):
+    """Курсор по месту в рейтинге: страница - один индексный диапазон без OFFSET"""
+    ordering = ('trending_rank',)
+    page_size = 10
+    max_page_size = 50
+    page_size_query_param = 'page_size'
+
+    def get_ordering(self, request, queryset, view):
+        # OrderingFilter вьюсета (?ordering=, ordering = ['-created_at'])
+        # к рейтингу не относится: порядок всегда по месту
+        return self.ordering
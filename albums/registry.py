@@ -0,0 +1,92 @@
+"""Реестр шаблонов альбомов в памяти процесса.
+
+Шаблоны меняются редко, а нужны почти каждому запросу: шаблон по
+умолчанию в Album.save, список в профиле, проверка премиума. Вся таблица
+AlbumTemplate держится в памяти воркера. Актуальность сверяется с меткой
+версии в общем кэше (settings.CACHES): сигналы шаблона ставят новую
+метку, и каждый воркер при следующем обращении перечитывает таблицу
+одним запросом. В установившемся режиме запросов к БД нет.
+
+Шаблоны из реестра общие для всех потоков - их нельзя менять на месте.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+
+VERSION_KEY = 'albums:templates:version'
+DEFAULT_TEMPLATE_NAME = 'Классический'
+
+
+class TemplateRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._templates = []
+        self._by_pk = {}
+        self._by_name = {}
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Метки нет (кэш очищен или вытеснен) - заводим новую, её подхватят все
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _ensure_loaded(self):
+        version = self._current_version()
+        if version == self._version and version is not None:
+            return
+        from .models import AlbumTemplate
+
+        with self._lock:
+            if version == self._version:
+                return
+            templates = list(AlbumTemplate.objects.all())
+            self._templates = templates
+            self._by_pk = {template.pk: template for template in templates}
+            self._by_name = {template.name: template for template in templates}
+            self._version = version
+
+    def version(self):
+        """Текущая метка: меняется вместе с любым шаблоном"""
+        return self._current_version()
+
+    def bump(self):
+        """Шаблоны изменились: новая метка версии для всех воркеров"""
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+    def clear(self):
+        """Забыть загруженное (для тестов: откат транзакции сигналов не шлёт)"""
+        with self._lock:
+            self._version = None
+
+    def all(self):
+        self._ensure_loaded()
+        return list(self._templates)
+
+    def free(self):
+        return [template for template in self.all() if not template.is_premium]
+
+    def available_to(self, user):
+        if user.is_authenticated and user.is_premium:
+            return self.all()
+        return self.free()
+
+    def get(self, pk):
+        self._ensure_loaded()
+        try:
+            return self._by_pk.get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def by_name(self, name):
+        self._ensure_loaded()
+        return self._by_name.get(name)
+
+    def default(self):
+        return self.by_name(DEFAULT_TEMPLATE_NAME)
+
+
+registry = TemplateRegistry()
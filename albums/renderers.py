@@ -0,0 +1,69 @@
+"""JSON для API через orjson, если он установлен.
+
+FastJSONRenderer и FastJSONParser - замена стандартных JSONRenderer и
+JSONParser DRF (REST_FRAMEWORK в settings). Вывод по значениям тот же,
+что у DRF: компактный UTF-8, даты в формате JSONEncoder DRF (его default
+обрабатывает всё, чего orjson не знает: Decimal, ленивые строки и т.п.).
+Побайтно может отличаться запись float: orjson пишет 1e-7 и 1e20, json -
+1e-07 и 1e+20. NaN и бесконечность orjson молча превратил бы в null,
+такие ответы отдаём DRF (при STRICT_JSON он отвечает ошибкой).
+Без orjson, с отступами (indent в Accept) и на всём, что orjson не осилил,
+работают стандартные классы DRF.
+"""
+import math
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, без него - стандартный json
+    orjson = None
+
+if orjson is not None:
+    # Даты отдаём encoder-у DRF: миллисекунды и 'Z' вместо '+00:00'
+    DUMPS_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+_default = JSONEncoder().default
+
+
+def _has_non_finite(data):
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_non_finite(value) for value in data)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=DUMPS_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # NaN и бесконечность orjson пишет как null - проверяем, только если null есть
+        if b'null' in ret and _has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как DRF: U+2028/U+2029 ломают JSONP и <script>, экранируем
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8').lower()
+        if orjson is None or encoding.replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
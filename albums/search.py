@@ -0,0 +1,121 @@
+"""Нечёткий поиск по триграммам (названия публичных альбомов и никнеймы)"""
+import math
+import re
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Album, SearchTrigram, User
+
+# Порог похожести (как similarity_threshold в pg_trgm)
+SIMILARITY_THRESHOLD = 0.3
+MAX_QUERY_LENGTH = 100
+# Сколько кандидатов берём из индекса на один результат
+CANDIDATES_PER_RESULT = 5
+
+_non_word = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """Нижний регистр, ё -> е, всё кроме букв и цифр -> пробел"""
+    text = (text or '').lower().replace('ё', 'е')
+    return _non_word.sub(' ', text).strip()
+
+
+def trigrams(text):
+    """Множество триграмм строки: каждое слово дополняется '  ' слева и ' ' справа"""
+    result = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def similarity(a, b):
+    """Коэффициент Жаккара по триграммам"""
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def _reindex(kind, object_id, text):
+    with transaction.atomic():
+        SearchTrigram.objects.filter(kind=kind, object_id=object_id).delete()
+        SearchTrigram.objects.bulk_create([
+            SearchTrigram(kind=kind, trigram=trigram, object_id=object_id)
+            for trigram in trigrams(text)
+        ])
+
+
+def index_album(album):
+    """Индексируем только публичные альбомы, скрытые убираем из индекса"""
+    if album.is_public and album.deleted_at is None:
+        _reindex(SearchTrigram.KIND_ALBUM, album.pk, album.title)
+    else:
+        unindex(SearchTrigram.KIND_ALBUM, album.pk)
+
+
+def index_user(user):
+    _reindex(SearchTrigram.KIND_USER, user.pk, user.username)
+
+
+def unindex(kind, object_id):
+    SearchTrigram.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def _candidates(kind, query_trigrams, limit):
+    """Пересечение множеств кандидатов: object_id, у которых совпало
+    не меньше min_hits триграмм запроса. Идёт только по индексу."""
+    # similarity >= t  =>  совпадений >= t * |Q|
+    min_hits = max(1, math.ceil(SIMILARITY_THRESHOLD * len(query_trigrams)))
+    rows = (
+        SearchTrigram.objects
+        .filter(kind=kind, trigram__in=query_trigrams)
+        .values('object_id')
+        .annotate(hits=Count('object_id'))
+        .filter(hits__gte=min_hits)
+        .order_by('-hits')[:limit * CANDIDATES_PER_RESULT]
+    )
+    return [row['object_id'] for row in rows]
+
+
+def _score(query_trigrams, text):
+    """Похожесть на строку целиком или на лучшее её слово
+    ('nastia' должно находить 'nastya_photo')"""
+    scores = [similarity(query_trigrams, trigrams(text))]
+    scores.extend(similarity(query_trigrams, trigrams(word)) for word in normalize(text).split())
+    return max(scores)
+
+
+def _rank(query_trigrams, objects, text_attr, limit):
+    ranked = []
+    for obj in objects:
+        score = _score(query_trigrams, getattr(obj, text_attr))
+        if score >= SIMILARITY_THRESHOLD:
+            ranked.append((score, obj))
+    ranked.sort(key=lambda item: -item[0])
+    return ranked[:limit]
+
+
+def fuzzy_albums(query, limit=10):
+    """[(similarity, album), ...] по убыванию похожести"""
+    query_trigrams = trigrams(query[:MAX_QUERY_LENGTH])
+    if not query_trigrams:
+        return []
+    ids = _candidates(SearchTrigram.KIND_ALBUM, query_trigrams, limit)
+    albums = Album.objects.public().filter(pk__in=ids).select_related(
+        'layout_template', 'user'
+    ).with_photo_stats()
+    return _rank(query_trigrams, albums, 'title', limit)
+
+
+def fuzzy_users(query, limit=10):
+    """[(similarity, user), ...] по убыванию похожести"""
+    query_trigrams = trigrams(query[:MAX_QUERY_LENGTH])
+    if not query_trigrams:
+        return []
+    ids = _candidates(SearchTrigram.KIND_USER, query_trigrams, limit)
+    users = User.objects.filter(pk__in=ids).only('id', 'username')
+    return _rank(query_trigrams, users, 'username', limit)
@@ -1,11 +1,118 @@
+from collections import Counter
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Album, Photo, AlbumTemplate, AlbumPage, PhotoEdit
+from django.db.models import Count, Sum
+from django.utils import timezone
+from .models import Album, Photo, AlbumTemplate, AlbumPage, PhotoEdit, EditPreset
+from .batch import METHODS as BATCH_METHODS
+from .counters import view_counter
+from .registry import registry
 
 User = get_user_model()
 
 
-class PhotoEditSerializer(serializers.ModelSerializer):
+def album_photos_count(album):
+    """Берём из with_photo_stats() или prefetch, иначе считаем запросом"""
+    if hasattr(album, 'photos_total'):
+        return album.photos_total
+    return album.photos.count()
+
+
+def album_size_mb(album):
+    if hasattr(album, 'photos_size'):
+        total_size = album.photos_size or 0
+    elif 'photos' in getattr(album, '_prefetched_objects_cache', {}):
+        total_size = sum(photo.file_size for photo in album.photos.all())
+    else:
+        total_size = album.photos.aggregate(total=Sum('file_size'))['total'] or 0
+    return round(total_size / 1024 / 1024, 2)
+
+
+def parse_field_tree(value):
+    """'id,photos.title' -> {'id': {}, 'photos': {'title': {}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def sparse_params(request):
+    """(fields, expand) из ?fields= и ?expand= запроса на чтение; fields=None - все поля"""
+    if request is None or request.method != 'GET':
+        return None, {}
+    fields = request.query_params.get('fields')
+    return (
+        parse_field_tree(fields) if fields is not None else None,
+        parse_field_tree(request.query_params.get('expand', '')),
+    )
+
+
+def field_requested(request, path, default=True):
+    """Нужно ли в ответе поле path ('photos.current_edit'): вьюсеты по нему
+    решают, что брать в select_related/prefetch_related"""
+    only, expand = sparse_params(request)
+    *parents, name = path.split('.')
+    for part in parents:
+        only = (only.get(part) or None) if only is not None else None
+        expand = expand.get(part, {})
+    if name in expand:
+        return True
+    if only is not None:
+        return name in only
+    return default
+
+
+def album_views_count(album):
+    """Просмотры из БД плюс ещё не сброшенные из буфера"""
+    return album.views_count + view_counter.pending(album.pk)
+
+
+class RegistryTemplateField(serializers.PrimaryKeyRelatedField):
+    """Шаблон по id из реестра в памяти (albums/registry.py), без запроса к БД"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        template = registry.get(data)
+        if template is None:
+            self.fail('does_not_exist', pk_value=data)
+        return template
+
+
+class SparseFieldsMixin:
+    """?fields=id,title,photos.title - только эти поля (вложенные - через точку),
+    ?expand=photos - добавить вложенные из Meta.expandable_fields.
+    Невыбранные вложенные сериализаторы не запускаются. Без параметров - все поля"""
+    _sparse = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self._sparse is not None:
+            only, expand = self._sparse
+        elif self.root in (self, self.parent):
+            only, expand = sparse_params(self.context.get('request'))
+        else:
+            only, expand = None, {}
+
+        for name, (serializer_class, kwargs) in getattr(self.Meta, 'expandable_fields', {}).items():
+            if name in expand:
+                fields[name] = serializer_class(**kwargs)
+        if only is not None:
+            fields = {name: field for name, field in fields.items() if name in only or name in expand}
+
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, SparseFieldsMixin):
+                nested._sparse = ((only.get(name) or None) if only is not None else None, expand.get(name, {}))
+        return fields
+
+
+class PhotoEditSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор редактирования фото"""
     
     class Meta:
@@ -27,79 +134,197 @@ class PhotoEditSerializer(serializers.ModelSerializer):
         return data
 
 
-class PhotoSerializer(serializers.ModelSerializer):
-    """Сериализатор фотографии"""
-    edits = PhotoEditSerializer(many=True, read_only=True)
-    edits_count = serializers.SerializerMethodField()
+MAX_ALBUM_PHOTOS = 100
+
+
+def as_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PhotoListSerializer(serializers.ListSerializer):
+    """Массовые операции над фото (PhotoViewSet.bulk): альбомы загружаются одним
+    запросом, права и лимит фото проверяются один раз на весь список, запись -
+    bulk_create / bulk_update. Для обновления instance - список фото с album,
+    в данных у каждого элемента id"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('allow_empty', False)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            items = [item for item in data if isinstance(item, dict)]
+            self.albums = Album.objects.in_bulk(
+                {pk for pk in (as_pk(item.get('album')) for item in items) if pk is not None}
+            )
+            self.by_id = {photo.pk: photo for photo in self.instance or []}
+            self.targets = []
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            photo = self.by_id.get(as_pk(data.get('id'))) if isinstance(data, dict) else None
+            if photo is None:
+                raise serializers.ValidationError({'id': 'Фото не найдено'})
+            if 'image' in data:
+                raise serializers.ValidationError({'image': 'Файл массово не заменяется'})
+            self.child.instance = photo
+            self.targets.append(photo)
+        return super().run_child_validation(data)
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        added = Counter()
+        for index, data in enumerate(attrs):
+            photo = self.targets[index] if self.instance is not None else None
+            album = data.get('album', photo.album if photo else None)
+            if album.user_id != user.pk:
+                raise serializers.ValidationError('Можно менять только фото своих альбомов')
+            if photo is None or photo.album_id != album.pk:
+                added[album.pk] += 1
+                if photo is not None:
+                    added[photo.album_id] -= 1
+
+        growing = [pk for pk, count in added.items() if count > 0]
+        counts = dict(
+            Photo.objects.filter(album__in=growing).order_by()
+            .values_list('album').annotate(total=Count('pk'))
+        ) if growing else {}
+        if any(counts.get(pk, 0) + added[pk] > MAX_ALBUM_PHOTOS for pk in growing):
+            raise serializers.ValidationError(f'Максимум {MAX_ALBUM_PHOTOS} фотографий в альбоме')
+        return attrs
+
+    def create(self, validated_data):
+        return Photo.objects.bulk_create([Photo(**data) for data in validated_data])
+
+    def update(self, instance, validated_data):
+        fields = {'updated_at'}
+        now = timezone.now()
+        for photo, data in zip(self.targets, validated_data):
+            for name, value in data.items():
+                setattr(photo, name, value)
+            photo.updated_at = now
+            fields.update(data)
+        Photo.objects.bulk_update(self.targets, sorted(fields))
+        return self.targets
+
+
+class PreloadedAlbumField(serializers.PrimaryKeyRelatedField):
+    """Альбом фото; в массовых операциях - из загруженных PhotoListSerializer"""
+
+    def to_internal_value(self, data):
+        albums = getattr(self.parent.parent, 'albums', None)
+        if albums is None:
+            return super().to_internal_value(data)
+        album = albums.get(as_pk(data))
+        if album is None:
+            self.fail('does_not_exist', pk_value=data)
+        return album
+
+
+class PhotoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Сериализатор фотографии: только текущая правка, вся история - в /photos/{id}/history/"""
+    album = PreloadedAlbumField(queryset=Album.objects.all())
+    current_edit = PhotoEditSerializer(read_only=True)
     
     class Meta:
         model = Photo
+        list_serializer_class = PhotoListSerializer
         fields = [
             'id', 'album', 'image', 'title', 'description',
             'uploaded_at', 'file_size', 'dimensions', 'order_index',
-            'edits', 'edits_count'
+            'current_edit', 'edits_count'
         ]
-        read_only_fields = ['id', 'uploaded_at', 'file_size']
-    
-    def get_edits_count(self, obj):
-        return obj.edits.count()
+        read_only_fields = ['id', 'uploaded_at', 'file_size', 'edits_count']
     
     def validate(self, data):
-        """Валидация: максимум 100 фото в альбоме"""
+        """Валидация: максимум 100 фото в альбоме (для списка - в PhotoListSerializer)"""
+        if isinstance(self.parent, PhotoListSerializer):
+            return data
         album = data.get('album', self.instance.album if self.instance else None)
-        if album and album.photos.exclude(pk=self.instance.pk if self.instance else None).count() >= 100:
+        if album and album.photos.exclude(pk=self.instance.pk if self.instance else None).count() >= MAX_ALBUM_PHOTOS:
             raise serializers.ValidationError('Максимум 100 фотографий в альбоме')
         return data
 
 
-class AlbumPageSerializer(serializers.ModelSerializer):
+class EditPresetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Сериализатор пресета правки (владелец - текущий пользователь)"""
+
+    class Meta:
+        model = EditPreset
+        fields = [
+            'id', 'name', 'filters_applied', 'brightness', 'contrast', 'saturation',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+    def validate_name(self, value):
+        presets = EditPreset.objects.filter(user=self.context['request'].user, name=value)
+        if self.instance is not None:
+            presets = presets.exclude(pk=self.instance.pk)
+        if presets.exists():
+            raise serializers.ValidationError('Пресет с таким названием уже есть')
+        return value
+
+
+class AlbumPageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор страницы альбома"""
     
     class Meta:
         model = AlbumPage
-        fields = ['id', 'album', 'page_number', 'layout', 'background_color', 'title']
+        fields = ['id', 'album', 'page_number', 'template', 'thumbnail']
         read_only_fields = ['id']
 
 
-class AlbumTemplateSerializer(serializers.ModelSerializer):
+class AlbumTemplateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор шаблона альбома"""
-    template_type_display = serializers.CharField(source='get_template_type_display', read_only=True)
-    
+    css_url = serializers.CharField(read_only=True)
+
     class Meta:
         model = AlbumTemplate
         fields = [
-            'id', 'name', 'description', 'template_type', 'template_type_display',
-            'thumbnail', 'css_styles', 'is_premium',
+            'id', 'name', 'description', 'thumbnail', 'css_styles', 'css_url', 'is_premium',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class AlbumListSerializer(serializers.ModelSerializer):
+class AlbumListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор списка альбомов (для пагинации)"""
     photos_count = serializers.SerializerMethodField()
     template_name = serializers.CharField(source='layout_template.name', read_only=True)
     album_size_mb = serializers.SerializerMethodField()
     user_username = serializers.CharField(source='user.username', read_only=True)
+    views_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Album
         fields = [
             'id', 'title', 'description', 'is_public',
             'created_at', 'updated_at',
-            'photos_count', 'template_name', 'album_size_mb', 'user_username'
+            'photos_count', 'template_name', 'album_size_mb', 'user_username',
+            'views_count'
         ]
+        # Только по ?expand=
+        expandable_fields = {
+            'template_details': (AlbumTemplateSerializer, {'source': 'layout_template', 'read_only': True}),
+            'photos': (PhotoSerializer, {'many': True, 'read_only': True}),
+        }
     
     def get_photos_count(self, obj):
-        return obj.photos.count()
+        return album_photos_count(obj)
     
     def get_album_size_mb(self, obj):
-        from django.db.models import Sum
-        total_size = obj.photos.aggregate(total=Sum('file_size'))['total'] or 0
-        return round(total_size / 1024 / 1024, 2)
+        return album_size_mb(obj)
+
+    def get_views_count(self, obj):
+        return album_views_count(obj)
 
 
-class AlbumDetailSerializer(serializers.ModelSerializer):
+class AlbumDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Детальный сериализатор альбома"""
     photos = PhotoSerializer(many=True, read_only=True)
     pages = AlbumPageSerializer(many=True, read_only=True)
@@ -108,6 +333,10 @@ class AlbumDetailSerializer(serializers.ModelSerializer):
     album_size_mb = serializers.SerializerMethodField()
     user_username = serializers.CharField(source='user.username', read_only=True)
     user_is_premium = serializers.BooleanField(source='user.is_premium', read_only=True)
+    views_count = serializers.SerializerMethodField()
+    layout_template = RegistryTemplateField(
+        queryset=AlbumTemplate.objects.all(), required=False, allow_null=True
+    )
     
     class Meta:
         model = Album
@@ -115,7 +344,7 @@ class AlbumDetailSerializer(serializers.ModelSerializer):
             'id', 'user', 'user_username', 'user_is_premium', 'title', 'description',
             'cover_photo', 'is_public', 'created_at', 'updated_at',
             'layout_template', 'template_details', 
-            'photos', 'pages', 'photos_count', 'album_size_mb'
+            'photos', 'pages', 'photos_count', 'album_size_mb', 'views_count'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
@@ -148,16 +377,20 @@ class AlbumDetailSerializer(serializers.ModelSerializer):
         return data
     
     def get_photos_count(self, obj):
-        return obj.photos.count()
+        return album_photos_count(obj)
     
     def get_album_size_mb(self, obj):
-        from django.db.models import Sum
-        total_size = obj.photos.aggregate(total=Sum('file_size'))['total'] or 0
-        return round(total_size / 1024 / 1024, 2)
+        return album_size_mb(obj)
+
+    def get_views_count(self, obj):
+        return album_views_count(obj)
 
 
 class AlbumCreateSerializer(serializers.ModelSerializer):
     """Сериализатор создания альбома"""
+    layout_template = RegistryTemplateField(
+        queryset=AlbumTemplate.objects.all(), required=False, allow_null=True
+    )
     
     class Meta:
         model = Album
@@ -194,3 +427,14 @@ class AlbumCreateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         validated_data['user'] = user
         return super().create(validated_data)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Подзапрос POST /api/batch/ (albums/batch.py)"""
+    method = serializers.ChoiceField(choices=BATCH_METHODS)
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False, allow_null=True)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True, allow_empty=False, max_length=settings.BATCH_MAX_REQUESTS)
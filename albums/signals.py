@@ -0,0 +1,214 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import backends, caching, edits, events, fragments, search, sync, tokens
+from .models import Album, AlbumPage, AlbumTemplate, ChangeLog, Photo, PhotoEdit, SearchTrigram, User
+from .registry import registry
+
+
+def _touches(update_fields, *fields):
+    """save(update_fields=...) без нужных полей индекс не меняет"""
+    return update_fields is None or bool(set(update_fields) & set(fields))
+
+
+def _owner(instance):
+    """Владелец альбома фото или страницы; без запроса, если альбом загружен"""
+    try:
+        return instance.album.user_id
+    except Album.DoesNotExist:
+        return None
+
+
+def _edit_album(instance):
+    """(альбом, владелец) правки; без запроса, если загружены фото и его альбом"""
+    if not hasattr(instance, '_album_owner'):
+        if PhotoEdit.photo.is_cached(instance) and Photo.album.is_cached(instance.photo):
+            instance._album_owner = (instance.photo.album_id, instance.photo.album.user_id)
+        else:
+            instance._album_owner = Photo.objects.filter(pk=instance.photo_id).values_list(
+                'album_id', 'album__user_id'
+            ).first() or (None, None)
+    return instance._album_owner
+
+
+@receiver(post_save, sender=Album)
+def album_saved(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or not _touches(update_fields, 'title', 'is_public'):
+        return
+    search.index_album(instance)
+
+
+@receiver(post_delete, sender=Album)
+def album_deleted(sender, instance, **kwargs):
+    search.unindex(SearchTrigram.KIND_ALBUM, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, raw=False, **kwargs):
+    # last_login обновляется с update_fields=['last_login'] - пропускаем
+    if raw or not _touches(update_fields, 'username'):
+        return
+    search.index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    search.unindex(SearchTrigram.KIND_USER, instance.pk)
+
+
+@receiver(post_save, sender=PhotoEdit)
+def photo_edit_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        edits.record_edit(instance)
+
+
+# ---------- сброс кэша GET /api/albums/{id}/ ----------
+
+@receiver([post_save, post_delete], sender=Album)
+def album_changed(sender, instance, **kwargs):
+    caching.invalidate_albums([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Photo)
+@receiver([post_save, post_delete], sender=AlbumPage)
+def album_child_changed(sender, instance, **kwargs):
+    caching.invalidate_albums([instance.album_id])
+
+
+@receiver([post_save, post_delete], sender=PhotoEdit)
+def photo_edit_changed(sender, instance, **kwargs):
+    album_id, _ = _edit_album(instance)
+    if album_id is not None:
+        caching.invalidate_albums([album_id])
+
+
+@receiver([post_save, post_delete], sender=AlbumTemplate)
+def template_changed(sender, instance, signal, **kwargs):
+    # Сразу - чтобы этот же процесс не отдал старый шаблон, после коммита -
+    # чтобы воркер, перечитавший таблицу до коммита, перечитал её ещё раз
+    registry.bump()
+    transaction.on_commit(registry.bump)
+    if signal is post_save:
+        caching.invalidate_albums(
+            Album.all_objects.filter(layout_template=instance).values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=AlbumTemplate)
+def template_deleting(sender, instance, **kwargs):
+    # В post_delete связь уже обнулена (SET_NULL), альбомы ищем до удаления
+    caching.invalidate_albums(
+        list(Album.all_objects.filter(layout_template=instance).values_list('pk', flat=True))
+    )
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, raw=False, **kwargs):
+    # В ответе альбома есть user_username и user_is_premium
+    if raw or not _touches(update_fields, 'username', 'is_premium'):
+        return
+    caching.invalidate_albums(instance.albums.values_list('pk', flat=True))
+    caching.bump_owners()
+
+
+# ---------- версии HTML-фрагментов HTMX (albums/fragments.py) ----------
+
+@receiver([post_save, post_delete], sender=Album)
+def album_fragments_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.bump_users([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Photo)
+def photo_fragments_changed(sender, instance, raw=False, **kwargs):
+    # В списке альбомов выводится число фото
+    if not raw:
+        fragments.bump_users([_owner(instance)])
+
+
+@receiver(post_save, sender=User)
+def user_fragments_changed(sender, instance, raw=False, **kwargs):
+    # Включая last_login: вход меняет CSRF-токен, а он есть во фрагментах
+    if not raw:
+        fragments.bump_users([instance.pk])
+
+
+# ---------- снимок пользователя и версия JWT (albums/backends.py, albums/tokens.py) ----------
+
+@receiver([post_save, post_delete], sender=User)
+def user_snapshot_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        backends.invalidate_user(instance.pk)
+        tokens.invalidate_version(instance.pk)
+
+
+# ---------- журнал изменений для /api/sync/ (albums/sync.py) ----------
+
+@receiver([post_save, post_delete], sender=Album)
+def album_logged(sender, instance, signal, raw=False, **kwargs):
+    if not raw:
+        sync.record(instance.user_id, ChangeLog.KIND_ALBUM, [instance.pk], deleted=signal is post_delete)
+
+
+@receiver([post_save, post_delete], sender=Photo)
+def photo_logged(sender, instance, signal, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    user_id = _owner(instance)
+    with sync.batched():
+        sync.record(user_id, ChangeLog.KIND_PHOTO, [instance.pk], deleted=signal is post_delete)
+        if created or signal is post_delete:
+            # У альбома меняется число фото
+            sync.record(user_id, ChangeLog.KIND_ALBUM, [instance.album_id])
+
+
+@receiver([post_save, post_delete], sender=AlbumPage)
+def page_logged(sender, instance, signal, raw=False, **kwargs):
+    if not raw:
+        sync.record(_owner(instance), ChangeLog.KIND_PAGE, [instance.pk], deleted=signal is post_delete)
+
+
+@receiver([post_save, post_delete], sender=PhotoEdit)
+def photo_edit_logged(sender, instance, signal, raw=False, **kwargs):
+    if raw:
+        return
+    _, user_id = _edit_album(instance)
+    with sync.batched():
+        sync.record(user_id, ChangeLog.KIND_EDIT, [instance.pk], deleted=signal is post_delete)
+        # Меняются current_edit и edits_count фото
+        sync.record(user_id, ChangeLog.KIND_PHOTO, [instance.photo_id])
+
+
+# ---------- живые обновления по SSE (albums/events.py) ----------
+
+@receiver([post_save, post_delete], sender=Album)
+def album_notified(sender, instance, signal, raw=False, **kwargs):
+    if not raw:
+        event = 'album_deleted' if signal is post_delete else 'album_updated'
+        events.notify(event, instance.pk, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Photo)
+def photo_notified(sender, instance, signal, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    event = 'photo_deleted' if signal is post_delete else 'photo_added' if created else 'photo_updated'
+    events.notify(event, instance.album_id, _owner(instance), photo=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=AlbumPage)
+def page_notified(sender, instance, raw=False, **kwargs):
+    # Без id страницы: пересборка альбома сливается у клиента в одно событие
+    if not raw:
+        events.notify('pages_changed', instance.album_id, _owner(instance))
+
+
+@receiver([post_save, post_delete], sender=PhotoEdit)
+def photo_edit_notified(sender, instance, signal, raw=False, **kwargs):
+    if raw:
+        return
+    album_id, user_id = _edit_album(instance)
+    if album_id is not None:
+        event = 'photo_updated' if signal is post_delete else 'edit_applied'
+        events.notify(event, album_id, user_id, photo=instance.photo_id)
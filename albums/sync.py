@@ -0,0 +1,127 @@
+"""Синхронизация офлайн-клиентов: GET /api/sync/?since=<курсор>.
+
+Каждое сохранение и удаление альбома, фото, страницы и правки пишет
+строку ChangeLog с владельцем альбома (signals.py; массовые операции без
+сигналов - сами через record()). id строки - курсор, он только растёт.
+Клиент присылает последний полученный курсор и получает текущее
+состояние изменённых после него объектов и id удалённых. Если изменений
+нет, ответ пустой и стоит два запроса по индексам.
+
+Без since, а также если нужные строки уже удалены prune() (курсор старше
+SYNC_LOG_RETENTION_DAYS), ответ - reset: клиент загружает всё через
+обычные эндпоинты и дальше синхронизируется с выданного курсора.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Album, AlbumPage, ChangeLog, Photo, PhotoEdit
+from .serializers import AlbumListSerializer, AlbumPageSerializer, PhotoEditSerializer, PhotoSerializer
+
+_local = threading.local()
+
+
+def _sources(user):
+    """kind -> (ключ ответа, живые объекты пользователя, сериализатор)"""
+    albums = Album.objects.filter(user=user)
+    return {
+        ChangeLog.KIND_ALBUM: (
+            'albums',
+            albums.select_related('layout_template', 'user').with_photo_stats(),
+            AlbumListSerializer,
+        ),
+        ChangeLog.KIND_PHOTO: (
+            'photos', Photo.objects.filter(album__in=albums).select_related('current_edit'), PhotoSerializer,
+        ),
+        ChangeLog.KIND_PAGE: ('pages', AlbumPage.objects.filter(album__in=albums), AlbumPageSerializer),
+        ChangeLog.KIND_EDIT: ('edits', PhotoEdit.objects.filter(photo__album__in=albums), PhotoEditSerializer),
+    }
+
+
+def _write(rows):
+    if rows:
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, kind=kind, object_id=object_id, deleted=deleted)
+            for user_id, kind, object_id, deleted in rows
+        ])
+
+
+def record(user_id, kind, object_ids, deleted=False):
+    """Пишет изменения в журнал; внутри batched() - одной вставкой в конце блока"""
+    if user_id is None:
+        return
+    rows = [(user_id, kind, object_id, deleted) for object_id in object_ids]
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        _write(rows)
+    else:
+        pending.update(dict.fromkeys(rows))
+
+
+@contextmanager
+def batched():
+    """Копит record() внутри блока и пишет их одной вставкой без повторов.
+    Вложенный блок пишет во внешний"""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = {}
+    try:
+        yield
+        rows = list(_local.pending)
+    finally:
+        _local.pending = None
+    _write(rows)
+
+
+def latest_cursor():
+    return ChangeLog.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def is_stale(since):
+    """Строки после since уже удалены prune()"""
+    first = ChangeLog.objects.order_by('pk').values_list('pk', flat=True).first()
+    return first is not None and since < first - 1
+
+
+def changes(user, since, limit=None):
+    """Ответ /api/sync/ для изменений пользователя после курсора since"""
+    limit = limit or settings.SYNC_PAGE_SIZE
+    rows = list(
+        ChangeLog.objects.filter(user=user, pk__gt=since).order_by('pk')
+        .values_list('pk', 'kind', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # По каждому объекту важна только последняя строка
+    latest = {}
+    for _, kind, object_id, deleted in rows:
+        latest[kind, object_id] = deleted
+
+    data = {'cursor': rows[-1][0] if rows else since, 'has_more': has_more, 'reset': False, 'deleted': {}}
+    for kind, (key, queryset, serializer_class) in _sources(user).items():
+        ids = [object_id for (row_kind, object_id), deleted in latest.items() if row_kind == kind and not deleted]
+        objects = list(queryset.filter(pk__in=ids)) if ids else []
+        found = {obj.pk for obj in objects}
+        data[key] = serializer_class(objects, many=True).data
+        # Удалённые и ставшие недоступными (альбом ждёт удаления) - одинаково
+        data['deleted'][key] = sorted(
+            object_id for (row_kind, object_id) in latest if row_kind == kind and object_id not in found
+        )
+    return data
+
+
+def reset():
+    return {'cursor': latest_cursor(), 'has_more': False, 'reset': True}
+
+
+def prune(days=None):
+    """Удаляет строки старше срока хранения. Самую новую оставляет: по ней
+    is_stale() отличает устаревший курсор. Возвращает число удалённых"""
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_LOG_RETENTION_DAYS if days is None else days)
+    deleted, _ = ChangeLog.objects.filter(created_at__lt=cutoff).exclude(pk=latest_cursor()).delete()
+    return deleted
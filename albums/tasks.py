@@ -0,0 +1,53 @@
+"""Фоновые задачи процесса: очередь в памяти и один поток-исполнитель.
+
+Брокера нет, задачи теряются при перезапуске процесса, поэтому всё,
+что ставится сюда, должно доделываться повторным запуском из cron
+(например, manage.py purge_deleted_albums).
+"""
+import logging
+import os
+import queue
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundQueue:
+    def __init__(self, name):
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, func, *args):
+        self._queue.put((func, args))
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        # После fork (gunicorn --preload) поток родителя в дочернем процессе не живёт
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
+            close_old_connections()
+            try:
+                func(*args)
+            except Exception:
+                logger.exception('Фоновая задача %s упала', getattr(func, '__name__', func))
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+
+background = BackgroundQueue('albums-background')
@@ -0,0 +1,150 @@
+"""CSS шаблонов альбомов по неизменяемым URL с хэшем содержимого.
+
+    /css/templates/<id>/<hash>.css            - CSS одного шаблона
+    /css/templates/bundle/<id,id,...>/<hash>.css - несколько шаблонов одним файлом
+
+Хэш считается по css_styles, поэтому после правки стилей меняется и URL.
+Старый URL отдаёт прежнее содержимое, пока оно в памяти процесса
+(оно соответствует своему хэшу), иначе редиректит на новый.
+
+Ответ минифицирован, заранее сжат gzip и brotli (если установлен пакет
+brotli) и лежит в памяти процесса, повторная отдача не ходит в БД.
+"""
+import gzip
+import hashlib
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него отдаём gzip
+    brotli = None
+
+CACHE_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+CompiledCSS = namedtuple('CompiledCSS', 'digest body gzip brotli')
+
+# Строки и url(...) - как есть, комментарии (группа не сработала) - выкинуть
+_TOKENS = re.compile(
+    r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\([^)"']*\))|/\*.*?\*/''', re.S | re.I
+)
+_SPACES = re.compile(r'\s+')
+_AROUND = re.compile(r'\s*([{};,>])\s*')
+_AFTER_COLON = re.compile(r':\s+')
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _minify_plain(css):
+    css = _SPACES.sub(' ', css)
+    css = _AROUND.sub(r'\1', css)
+    # Пробел перед ":" не трогаем: "a :hover" и "a:hover" - разные селекторы
+    css = _AFTER_COLON.sub(':', css)
+    return css.replace(';}', '}')
+
+
+def minify(css):
+    """Сжимает только текст вне строк и url(...): content и селекторы
+    атрибутов должны остаться как написаны"""
+    parts = []
+    plain = ''
+    chunks = _TOKENS.split(css)
+    for index, chunk in enumerate(chunks):
+        if index % 2 == 0:
+            plain += chunk
+        elif chunk is not None:
+            parts += [_minify_plain(plain), chunk]
+            plain = ''
+    parts.append(_minify_plain(plain))
+    return ''.join(parts).strip()
+
+
+def css_digest(*sources):
+    return hashlib.sha256('\0'.join(sources).encode()).hexdigest()[:16]
+
+
+def css_url(template):
+    return reverse('albums:template_css', args=[template.pk, css_digest(template.css_styles)])
+
+
+def bundle_url(templates):
+    ids = ','.join(str(template.pk) for template in templates)
+    digest = css_digest(*(template.css_styles for template in templates))
+    return reverse('albums:template_css_bundle', args=[ids, digest])
+
+
+def compile_css(digest, sources):
+    body = '\n'.join(minify(css) for css in sources).encode()
+    return CompiledCSS(
+        digest=digest,
+        body=body,
+        gzip=gzip.compress(body, compresslevel=9, mtime=0),
+        brotli=brotli.compress(body) if brotli else None,
+    )
+
+
+def _load_templates(template_ids):
+    from .models import AlbumTemplate
+
+    templates = AlbumTemplate.objects.in_bulk(template_ids)
+    if len(templates) != len(set(template_ids)):
+        return None
+    return [templates[pk] for pk in template_ids]
+
+
+def load(template_ids, digest):
+    """Скомпилированный CSS, если digest совпадает с текущими стилями, иначе None.
+    В памяти держим только совпавшие: содержимое по такому ключу уже не изменится"""
+    key = (tuple(template_ids), digest)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    templates = _load_templates(template_ids)
+    if templates is None:
+        return None
+    sources = [template.css_styles for template in templates]
+    if css_digest(*sources) != digest:
+        return None
+
+    compiled = compile_css(digest, sources)
+    with _cache_lock:
+        _cache[key] = compiled
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def current_url(template_ids):
+    """Актуальный URL для устаревшей ссылки, None - шаблона нет"""
+    templates = _load_templates(template_ids)
+    if templates is None:
+        return None
+    if len(templates) == 1:
+        return css_url(templates[0])
+    return bundle_url(templates)
+
+
+def css_response(request, compiled):
+    accepted = request.headers.get('Accept-Encoding', '')
+    body, encoding = compiled.body, None
+    if compiled.brotli is not None and 'br' in accepted:
+        body, encoding = compiled.brotli, 'br'
+    elif 'gzip' in accepted:
+        body, encoding = compiled.gzip, 'gzip'
+
+    response = HttpResponse(body, content_type='text/css; charset=utf-8')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Cache-Control'] = IMMUTABLE
+    response['ETag'] = f'"{compiled.digest}"'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -1,3 +1,1563 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3 import base as django_sqlite_base
+from django.http import HttpResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from app.db import routers
+from app.db.sqlite3 import base as sqlite_base
+from app.middleware import COMPRESSORS, CompressionMiddleware, ReplicaPinMiddleware, negotiate
+from . import events, fragments, renderers, search, sync, template_css, throttling
+from .counters import ViewCounter, view_counter
+from .deletion import purge_album, tombstone_album
+from .edits import compact_edit_history, discard_edit, replay
+from .media_gc import storage_names
+from .models import (
+    Album, Photo, AlbumTemplate, AlbumPage, PhotoEdit, PhotoEditHistory, EditPreset, ChangeLog, User
+)
+from .registry import TemplateRegistry, registry
+from .renderers import FastJSONParser, FastJSONRenderer
+from .serializers import MAX_ALBUM_PHOTOS
+from .template_css import css_digest, minify
+from .trending import compute_trending, trending_score
+from .urls import router
+from .views import PhotoViewSet
+
+
+# Таблицы, которые нельзя читать полным сканированием
+GUARDED_TABLES = ('albums_album', 'albums_photo')
+
+# Бюджет запросов на эндпоинт (имя маршрута роутера -> максимум SQL-запросов).
+# Новый эндпоинт без бюджета роняет test_every_endpoint_has_budget.
+# GET списков и деталей альбомов и фото включают один намеренный запрос
+# валидаторов условного GET (albums/conditional.py): он идёт до загрузки
+# строк, чтобы 304 обходился без них и без сериализатора.
+QUERY_BUDGETS = {
+    'album-list': 3,
+    'album-detail': 4,
+    'album-fuzzy': 4,
+    'album-my-albums': 2,
+    'album-popular': 1,
+    'album-user-stats': 3,
+    'album-publish': 9,
+    'album-unpublish': 7,
+    'album-apply-template': 9,
+    'album-apply-preset': 10,
+    'photo-list': 3,
+    'photo-detail': 2,
+    'photo-add-edit': 5,
+    'photo-reorder': 3,
+    'photo-history': 3,
+    'photo-bulk': 5,
+    'template-list': 0,
+    'template-detail': 0,
+    'template-available': 0,
+    'page-list': 2,
+    'page-detail': 1,
+    'edit-list': 2,
+    'edit-detail': 1,
+    'preset-list': 2,
+    'preset-detail': 1,
+}
+
+
+def seed_dataset():
+    """Набор данных, похожий на рабочий: несколько пользователей,
+    у каждого публичные и приватные альбомы со страницами, фото и правками"""
+    classic = AlbumTemplate.objects.create(name='Классический', css_styles='.page{margin:0}')
+    premium = AlbumTemplate.objects.create(name='Премиум', is_premium=True)
+
+    users = [
+        User.objects.create_user(
+            email=f'user{i}@example.com', first_name='Имя', last_name='Фамилия',
+            username=f'user{i}', password='password123', is_premium=(i == 0)
+        )
+        for i in range(4)
+    ]
+    for user in users:
+        for a in range(6):
+            album = Album.objects.create(
+                user=user,
+                title=f'Альбом {a} {user.username}',
+                is_public=(a % 2 == 0),
+                layout_template=premium if user.is_premium and a == 0 else classic,
+            )
+            page = AlbumPage.objects.create(album=album, page_number=1, template=classic)
+            photos = Photo.objects.bulk_create([
+                Photo(album=album, page=page, image=f'photos/{album.pk}_{p}.jpg',
+                      title=f'Фото {p}', file_size=1024 * (p + 1), order_index=p)
+                for p in range(5)
+            ])
+            PhotoEdit.objects.bulk_create([
+                PhotoEdit(photo=photo, brightness=10) for photo in photos
+            ])
+    return users, classic
+
+
+def router_endpoints():
+    """(имя маршрута, метод, detail) для каждого эндпоинта роутера albums/urls.py"""
+    endpoints = []
+    for prefix, viewset, basename in router.registry:
+        endpoints.append((f'{basename}-list', 'get', False))
+        endpoints.append((f'{basename}-detail', 'get', True))
+        for extra in viewset.get_extra_actions():
+            for method in extra.mapping:
+                endpoints.append((f'{basename}-{extra.url_name}', method, extra.detail))
+    return endpoints
+
+
+def table_aliases(sql):
+    """Имена, под которыми защищённые таблицы видны в плане (таблица или её алиас)"""
+    aliases = set()
+    for table in GUARDED_TABLES:
+        if f'"{table}"' in sql:
+            aliases.add(table)
+        aliases.update(re.findall(rf'"{table}" (?:AS )?"?(\w+)"?', sql))
+    return aliases - {'AS', 'WHERE', 'INNER', 'LEFT', 'ON', 'ORDER', 'GROUP'}
+
+
+def full_scans(sql):
+    """Строки EXPLAIN QUERY PLAN со SCAN по albums_album/albums_photo"""
+    aliases = table_aliases(sql)
+    if not aliases:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = [row[-1] for row in cursor.fetchall()]
+    return [
+        line for line in plan
+        if any(re.match(rf'SCAN {re.escape(alias)}\b', line) for alias in aliases)
+    ]
+
+
+class AlbumsTestCase(TestCase):
+    """Кэш и реестр шаблонов переживают откат транзакции теста (сигналов
+    при откате нет), поэтому сбрасываем их перед классом и каждым тестом"""
+
+    @classmethod
+    def setUpClass(cls):
+        cache.clear()
+        registry.clear()
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        registry.clear()
+
+
+class QueryPlanRegressionTests(AlbumsTestCase):
+    """Прогоняет каждый эндпоинт роутера и проверяет SQL:
+    нет полных сканов albums_album/albums_photo и число запросов в бюджете"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.template = seed_dataset()
+        compute_trending()
+        cls.user = cls.users[0]
+        cls.album = Album.objects.filter(user=cls.user).order_by('pk').first()
+        cls.photo = cls.album.photos.first()
+        cls.preset = EditPreset.objects.create(user=cls.user, name='Тёплый', brightness=10)
+
+    def setUp(self):
+        super().setUp()
+        # Бюджеты - для установившегося режима: реестр шаблонов уже загружен
+        registry.all()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Просмотры сбрасываем внутри транзакции теста, без фонового потока
+        patcher = mock.patch.object(view_counter, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(view_counter.flush)
+
+    def request_kwargs(self, name):
+        return {
+            'album-fuzzy': {'data': {'q': 'albom user1'}},
+            'album-apply-template': {'data': {'template_id': self.template.pk}},
+            'album-apply-preset': {'data': {'preset_id': self.preset.pk}},
+            'photo-reorder': {'data': {'order_index': 3}},
+            'photo-bulk': {'data': [{'id': self.photo.pk, 'title': 'Новое'}], 'format': 'json'},
+            'photo-add-edit': {
+                'data': {'photo': self.photo.pk, 'brightness': 5, 'contrast': 5, 'saturation': 0}
+            },
+        }.get(name, {})
+
+    def pk_for(self, name):
+        return {
+            'album': self.album.pk,
+            'photo': self.photo.pk,
+            'template': self.template.pk,
+            'page': self.album.pages.first().pk,
+            'edit': self.photo.edits.first().pk,
+            'preset': self.preset.pk,
+        }[name.split('-')[0]]
+
+    def call(self, name, method, detail, client=None):
+        client = client or self.client
+        url = reverse(f'albums:{name}', kwargs={'pk': self.pk_for(name)} if detail else None)
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method)(url, **self.request_kwargs(name))
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_every_endpoint_has_budget(self):
+        names = {name for name, _, _ in router_endpoints()}
+        self.assertEqual(names - set(QUERY_BUDGETS), set())
+
+    def check_endpoints(self, client):
+        # Сначала чтение, потом запись: unpublish не должен прятать альбом от GET
+        endpoints = sorted(router_endpoints(), key=lambda endpoint: endpoint[1] != 'get')
+        for name, method, detail in endpoints:
+            with self.subTest(endpoint=name, method=method):
+                response, queries = self.call(name, method, detail, client)
+                self.assertLess(response.status_code, 500)
+                self.assertLessEqual(
+                    len(queries), QUERY_BUDGETS[name],
+                    f'{name}: {len(queries)} запросов:\n' + '\n'.join(queries)
+                )
+                for sql in queries:
+                    self.assertEqual(full_scans(sql), [], f'{name}: полный скан в\n{sql}')
+
+    def test_authenticated_endpoints(self):
+        self.check_endpoints(self.client)
+
+    def test_anonymous_endpoints(self):
+        self.check_endpoints(APIClient())
+
+
+@mock.patch('app.db.routers.replica_available', return_value=True)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        routers.reset_pin()
+        self.router = routers.PrimaryReplicaRouter()
+
+    def test_reads_go_to_replica(self, _):
+        self.assertEqual(self.router.db_for_read(Album), 'replica')
+        self.assertEqual(self.router.db_for_write(Album), 'default')
+
+    def test_reads_after_write_stay_on_primary(self, _):
+        self.router.db_for_write(Photo)
+        self.assertEqual(self.router.db_for_read(Album), 'default')
+
+    def test_middleware_pins_next_requests_after_write(self, _):
+        def write_view(request):
+            self.router.db_for_write(Photo)
+            return HttpResponse()
+
+        factory = RequestFactory()
+        response = ReplicaPinMiddleware(write_view)(factory.post('/'))
+        cookie = response.cookies[ReplicaPinMiddleware.cookie_name]
+
+        seen = {}
+
+        def read_view(request):
+            seen['db'] = self.router.db_for_read(Album)
+            return HttpResponse()
+
+        request = factory.get('/')
+        request.COOKIES[ReplicaPinMiddleware.cookie_name] = cookie.value
+        ReplicaPinMiddleware(read_view)(request)
+        self.assertEqual(seen['db'], 'default')
+
+        ReplicaPinMiddleware(read_view)(factory.get('/'))
+        self.assertEqual(seen['db'], 'replica')
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    """Бэкенд app.db.sqlite3 на файловой БД: в in-memory БД тестов замок
+    записи и прагмы отключены"""
+    alias = 'sqlite_file'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = sqlite_base.DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': str(Path(directory.name) / 'test.sqlite3'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {'pragmas': {'busy_timeout': 200}, 'write_retries': 2, 'retry_backoff': 0},
+        }, self.alias)
+        connections[self.alias] = self.db
+        self.addCleanup(delattr, connections._connections, self.alias)
+        self.addCleanup(self.db.close)
+        with self.db.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)')
+
+    def pragma(self, name):
+        with self.db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_wal_and_pragmas_are_applied(self):
+        self.assertTrue(self.db.serializes_writes())
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 200)
+        self.assertEqual(self.pragma('cache_size'), sqlite_base.DEFAULT_PRAGMAS['cache_size'])
+
+    def test_transaction_holds_write_lock_until_commit_or_rollback(self):
+        with transaction.atomic(using=self.alias):
+            self.db.cursor().execute("INSERT INTO item (name) VALUES ('a')")
+            self.assertTrue(self.db.write_lock.locked())
+        self.assertFalse(self.db.write_lock.locked())
+
+        with self.assertRaises(ZeroDivisionError), transaction.atomic(using=self.alias):
+            self.db.cursor().execute("INSERT INTO item (name) VALUES ('b')")
+            self.assertTrue(self.db.write_lock.locked())
+            1 / 0
+        self.assertFalse(self.db.write_lock.locked())
+        with self.db.cursor() as cursor:
+            cursor.execute('SELECT name FROM item')
+            self.assertEqual(cursor.fetchall(), [('a',)])
+
+    def test_locked_write_is_retried_then_raises(self):
+        write = mock.Mock(side_effect=sqlite3.OperationalError('database is locked'))
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.run_write(write)
+        self.assertEqual(write.call_count, 3)
+        self.assertFalse(self.db.write_lock.locked())
+
+    def test_locked_begin_is_retried_then_releases_lock(self):
+        begin = mock.patch.object(
+            django_sqlite_base.DatabaseWrapper, '_start_transaction_under_autocommit',
+            side_effect=OperationalError('database is locked'),
+        )
+        with begin as start, self.assertRaises(OperationalError), transaction.atomic(using=self.alias):
+            pass
+        self.assertEqual(start.call_count, 3)
+        self.assertFalse(self.db.write_lock.locked())
+
+
+class FuzzySearchTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        AlbumTemplate.objects.create(name='Классический')
+        cls.user = User.objects.create_user(
+            email='nastya@example.com', first_name='a', last_name='b', username='nastya_photo'
+        )
+        cls.album = Album.objects.create(user=cls.user, title='Морское путешествие', is_public=True)
+
+    def album_ids(self, query):
+        return [album.pk for _, album in search.fuzzy_albums(query)]
+
+    def usernames(self, query):
+        return [user.username for _, user in search.fuzzy_users(query)]
+
+    def test_typos_match_best_word(self):
+        self.assertEqual(self.usernames('nastia'), ['nastya_photo'])
+        self.assertEqual(self.album_ids('морское путешествее'), [self.album.pk])
+        self.assertEqual(self.album_ids('путешествие'), [self.album.pk])
+
+    def test_dissimilar_queries_are_cut_off_by_threshold(self):
+        self.assertLess(search._score(search.trigrams('мороз'), self.album.title), search.SIMILARITY_THRESHOLD)
+        self.assertEqual(self.album_ids('мороз'), [])
+        self.assertEqual(self.usernames('natasha'), [])
+        self.assertEqual(self.album_ids('!!!'), [])
+
+    def test_private_and_tombstoned_albums_are_excluded(self):
+        self.album.is_public = False
+        self.album.save()
+        self.assertEqual(self.album_ids('путешествие'), [])
+
+        public = Album.objects.create(user=self.user, title='Путешествие в горы', is_public=True)
+        self.assertEqual(self.album_ids('путешествие'), [public.pk])
+        tombstone_album(public)
+        self.assertEqual(self.album_ids('путешествие'), [])
+
+    def test_renames_are_reindexed(self):
+        self.album.title = 'Зимние каникулы'
+        self.album.save()
+        self.assertEqual(self.album_ids('путешествие'), [])
+        self.assertEqual(self.album_ids('каникулы'), [self.album.pk])
+
+        self.user.username = 'olga'
+        self.user.save()
+        self.assertEqual(self.usernames('nastia'), [])
+        self.assertEqual(self.usernames('olga'), ['olga'])
+
+
+class ViewCounterTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='viewer@example.com', first_name='a', last_name='b', username='viewer'
+        )
+        cls.albums = [Album.objects.create(user=cls.user, title=f'A{i}') for i in range(3)]
+
+    def test_views_are_buffered_and_flushed_in_one_update(self):
+        counter = ViewCounter()
+        counter._ensure_flusher = lambda: None
+        for album, views in zip(self.albums, (3, 1, 0)):
+            for _ in range(views):
+                counter.record(album.pk)
+
+        self.assertEqual(counter.pending(self.albums[0].pk), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(counter.flush(), 2)
+
+        self.assertEqual(
+            list(Album.objects.order_by('pk').values_list('views_count', flat=True)), [3, 1, 0]
+        )
+        self.assertEqual(counter.pending(self.albums[0].pk), 0)
+
+
+class TrendingTests(AlbumsTestCase):
+    def test_score_decays_with_age(self):
+        now = timezone.now()
+        fresh = trending_score(5, 10, now, now, half_life_hours=48)
+        old = trending_score(5, 10, now - timedelta(hours=48), now, half_life_hours=48)
+        self.assertAlmostEqual(old, fresh / 2)
+
+    def test_popular_is_paginated_by_rank(self):
+        user = User.objects.create_user(
+            email='trend@example.com', first_name='a', last_name='b', username='trend'
+        )
+        for i, views in enumerate((5, 50, 0)):
+            album = Album.objects.create(user=user, title=f'T{i}', is_public=True, views_count=views)
+            for n in range(3):
+                Photo.objects.create(album=album, title=f'p{n}', image=f'p{n}.jpg', file_size=1)
+        Album.objects.create(user=user, title='Пустой', is_public=True, views_count=1000)
+        compute_trending()
+
+        response = self.client.get(reverse('albums:album-popular'), {'page_size': 2})
+        self.assertEqual([a['title'] for a in response.data['results']], ['T1', 'T0'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([a['title'] for a in response.data['results']], ['T2'])
+        self.assertIsNone(response.data['next'])
+
+    def test_empty_ranking_is_not_recomputed_in_requests(self):
+        with mock.patch('albums.views.background.submit') as submit:
+            for _ in range(3):
+                with self.assertNumQueries(1):
+                    response = self.client.get(reverse('albums:album-popular'))
+                self.assertEqual(response.data['results'], [])
+        submit.assert_called_once_with(compute_trending)
+
+
+@override_settings(EDIT_HISTORY_KEEP=2, EDIT_HISTORY_MAX_DELTAS=3, EDIT_HISTORY_RETENTION_DAYS=30)
+class EditHistoryTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='editor@example.com', first_name='a', last_name='b', username='editor'
+        )
+        album = Album.objects.create(user=user, title='Правки')
+        cls.photo = Photo.objects.create(album=album, image='p.jpg')
+
+    def edit(self, brightness, **fields):
+        return PhotoEdit.objects.create(photo=self.photo, brightness=brightness, **fields)
+
+    def test_new_edit_becomes_current(self):
+        self.edit(10)
+        last = self.edit(20)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.current_edit, last)
+        self.assertEqual(self.photo.edits_count, 2)
+
+        discard_edit(last)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.current_edit.brightness, 10)
+        self.assertEqual(self.photo.edits_count, 1)
+
+    def test_compaction_keeps_recent_rows_and_stores_deltas(self):
+        for value in range(1, 6):
+            self.edit(value * 10, contrast=5)
+
+        self.assertEqual(compact_edit_history(), 3)
+        self.assertEqual(
+            list(PhotoEdit.objects.filter(photo=self.photo).values_list('brightness', flat=True)), [50, 40]
+        )
+        history = PhotoEditHistory.objects.get(photo=self.photo)
+        self.assertEqual(history.base['brightness'], 10)
+        self.assertEqual([d['set'] for d in history.deltas], [{'brightness': 20}, {'brightness': 30}])
+        self.assertEqual([state['brightness'] for _, state in replay(history)], [10, 20, 30])
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.current_edit.brightness, 50)
+        self.assertEqual(self.photo.edits_count, 5)
+
+    def test_retention_folds_old_and_excess_deltas_into_base(self):
+        old = self.edit(1)
+        PhotoEdit.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=60))
+        for value in range(2, 9):
+            self.edit(value)
+
+        compact_edit_history()
+        history = PhotoEditHistory.objects.get(photo=self.photo)
+        self.assertEqual(len(history.deltas), 3)
+        self.assertEqual(history.base['brightness'], 3)
+        self.assertEqual(replay(history)[-1][1]['brightness'], 6)
+
+
+class AlbumDeletionTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='owner@example.com', first_name='a', last_name='b', username='owner'
+        )
+        cls.template = AlbumTemplate.objects.create(name='Шаблон', thumbnail='shared/thumb.jpg')
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = Path(media.name)
+        settings_patch = override_settings(MEDIA_ROOT=media.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+        self.album = Album.objects.create(user=self.user, title='Отпуск', is_public=True)
+        for name in ('photos/a.jpg', 'photos/b.jpg', 'shared/thumb.jpg'):
+            (self.media / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.media / name).write_bytes(b'x')
+        for name in ('photos/a.jpg', 'photos/b.jpg'):
+            photo = Photo.objects.create(album=self.album, image=name)
+            PhotoEdit.objects.create(photo=photo, brightness=5)
+        AlbumPage.objects.create(album=self.album, page_number=1, thumbnail=self.template.thumbnail)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_delete_hides_album_and_schedules_purge(self):
+        url = reverse('albums:album-detail', kwargs={'pk': self.album.pk})
+        with mock.patch('albums.deletion.background.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertNumQueries(5):
+                    response = self.client.delete(url)
+
+        self.assertEqual(response.status_code, 204)
+        submit.assert_called_once_with(purge_album, self.album.pk)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(Album.objects.filter(pk=self.album.pk).exists())
+        self.assertFalse(AlbumPage.objects.filter(album__in=Album.objects.all()).exists())
+        self.assertTrue(Photo.objects.filter(album_id=self.album.pk).exists())
+
+        # Название свободно сразу, не дожидаясь фонового удаления
+        Album.objects.create(user=self.user, title='Отпуск')
+
+    def test_purge_removes_rows_in_batches_and_unlinks_files(self):
+        Album.all_objects.filter(pk=self.album.pk).update(deleted_at=timezone.now())
+
+        self.assertTrue(purge_album(self.album.pk, batch_size=1))
+
+        self.assertFalse(Album.all_objects.filter(pk=self.album.pk).exists())
+        self.assertFalse(Photo.objects.exists())
+        self.assertFalse(PhotoEdit.objects.exists())
+        self.assertFalse(AlbumPage.objects.exists())
+        self.assertFalse((self.media / 'photos/a.jpg').exists())
+        self.assertFalse((self.media / 'photos/b.jpg').exists())
+        # Миниатюра страницы - общий файл шаблона, его не трогаем
+        self.assertTrue((self.media / 'shared/thumb.jpg').exists())
+
+    def test_purge_ignores_live_albums(self):
+        self.assertFalse(purge_album(self.album.pk))
+        self.assertTrue(Photo.objects.filter(album=self.album).exists())
+
+
+class MediaGCTests(AlbumsTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = Path(media.name)
+        settings_patch = override_settings(MEDIA_ROOT=media.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+        user = User.objects.create_user(
+            email='gc@example.com', first_name='a', last_name='b', username='gc'
+        )
+        album = Album.objects.create(user=user, title='GC')
+        Photo.objects.create(album=album, image='photos/2026/keep.jpg')
+        AlbumPage.objects.create(album=album, page_number=1, thumbnail='album_pages/thumbnails/keep.png')
+
+        day_ago = time.time() - 2 * 24 * 3600
+        for name in (
+            'photos/2026/keep.jpg', 'photos/2026/orphan.jpg', 'photos/2026.jpg',
+            'photos/2026/01/old.jpg', 'album_pages/thumbnails/keep.png',
+            'album_pages/thumbnails/orphan.png', 'photos/fresh.jpg',
+        ):
+            path = self.media / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'x')
+            if name != 'photos/fresh.jpg':
+                os.utime(path, (day_ago, day_ago))
+
+    def test_storage_names_are_globally_sorted(self):
+        names = list(storage_names(default_storage, 'photos'))
+        self.assertEqual(names, sorted(names))
+        self.assertIn('photos/2026.jpg', names)
+
+    def test_dry_run_reports_without_deleting(self):
+        out = StringIO()
+        call_command('media_gc', '--dry-run', verbosity=2, stdout=out)
+        self.assertEqual(
+            sorted(line for line in out.getvalue().splitlines() if '/' in line),
+            ['album_pages/thumbnails/orphan.png', 'photos/2026.jpg',
+             'photos/2026/01/old.jpg', 'photos/2026/orphan.jpg'],
+        )
+        self.assertTrue((self.media / 'photos/2026/orphan.jpg').exists())
+
+    def test_deletes_orphans_older_than_grace(self):
+        call_command('media_gc', '--pause', '0', '--batch-size', '2', stdout=StringIO())
+        remaining = sorted(
+            str(path.relative_to(self.media)) for path in self.media.rglob('*') if path.is_file()
+        )
+        self.assertEqual(
+            remaining,
+            ['album_pages/thumbnails/keep.png', 'photos/2026/keep.jpg', 'photos/fresh.jpg'],
+        )
+
+
+class AlbumDetailCacheTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            email='cached@example.com', first_name='a', last_name='b', username='cached'
+        )
+        cls.other = User.objects.create_user(
+            email='other@example.com', first_name='a', last_name='b', username='other'
+        )
+        cls.template = AlbumTemplate.objects.create(name='Кэш')
+        cls.album = Album.objects.create(
+            user=cls.owner, title='Горячий', is_public=True, layout_template=cls.template
+        )
+        cls.photo = Photo.objects.create(album=cls.album, image='photos/hot.jpg', title='До')
+        cls.private = Album.objects.create(user=cls.owner, title='Личный')
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(view_counter, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(view_counter.flush)
+
+    def get(self, album, user=None):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.get(reverse('albums:album-detail', kwargs={'pk': album.pk}))
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.get(self.album)
+        with self.assertNumQueries(0):
+            second = self.get(self.album)
+        self.assertEqual(second.data['photos'], first.data['photos'])
+        self.assertEqual(second.data['views_count'], first.data['views_count'] + 1)
+
+    def test_child_and_template_changes_invalidate(self):
+        self.get(self.album)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photo.title = 'После'
+            self.photo.save()
+        self.assertEqual(self.get(self.album).data['photos'][0]['title'], 'После')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template.description = 'Новое описание'
+            self.template.save()
+        self.assertEqual(self.get(self.album).data['template_details']['description'], 'Новое описание')
+
+    def test_template_delete_invalidates(self):
+        self.assertEqual(self.get(self.album).data['template_details']['name'], 'Кэш')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template.delete()
+        self.assertIsNone(self.get(self.album).data['template_details'])
+
+    def test_private_album_is_cached_for_owner_only(self):
+        self.assertEqual(self.get(self.private, self.owner).status_code, 200)
+        self.assertEqual(self.get(self.private, self.other).status_code, 404)
+        self.assertEqual(self.get(self.private).status_code, 404)
+
+
+class ConditionalGetTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='etag@example.com', first_name='a', last_name='b', username='etag'
+        )
+        cls.template = AlbumTemplate.objects.create(name='ETag')
+        cls.album = Album.objects.create(user=cls.user, title='ETag', is_public=True)
+        cls.photo = Photo.objects.create(album=cls.album, image='photos/etag.jpg')
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(view_counter, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(view_counter.flush)
+
+    def test_album_detail_answers_304_until_child_changes(self):
+        url = reverse('albums:album-detail', kwargs={'pk': self.album.pk})
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PhotoEdit.objects.create(photo=self.photo, brightness=30)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_owner_rename_changes_album_validators(self):
+        urls = [reverse('albums:album-detail', kwargs={'pk': self.album.pk}), reverse('albums:album-list')]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        self.user.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('renamed', response.content.decode())
+
+    def test_photo_list_skips_serializer_when_not_modified(self):
+        url = reverse('albums:photo-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_full_response_costs_one_validator_query(self):
+        # Полный ответ дороже прежнего ровно на запрос валидаторов - он учтён в QUERY_BUDGETS
+        url = reverse('albums:photo-list')
+        with CaptureQueriesContext(connection) as full:
+            self.client.get(url)
+        with mock.patch.object(PhotoViewSet, 'list_state', return_value=()):
+            with CaptureQueriesContext(connection) as plain:
+                self.client.get(url)
+        self.assertEqual(len(full) - len(plain), 1)
+        self.assertIn('MAX(', full[0]['sql'])
+
+    def test_template_detail_honours_if_modified_since(self):
+        url = reverse('albums:template-detail', kwargs={'pk': self.template.pk})
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+class TemplateCSSTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = AlbumTemplate.objects.create(
+            name='Первый', css_styles='/* фон */\n.page {\n  color: red;\n}\na :hover { color: blue; }'
+        )
+        cls.second = AlbumTemplate.objects.create(name='Второй', css_styles='.photo { margin: 0 }')
+
+    def setUp(self):
+        super().setUp()
+        template_css._cache.clear()
+
+    def test_minify(self):
+        self.assertEqual(minify(self.first.css_styles), '.page{color:red}a :hover{color:blue}')
+
+    def test_minify_keeps_strings_and_urls(self):
+        css = '.p::before { content: "Page :  1 , 2" ; }\na[title="x ; y"] { background: url(a.png?x=1,2) ; }'
+        self.assertEqual(
+            minify(css), '.p::before{content:"Page :  1 , 2"}a[title="x ; y"]{background:url(a.png?x=1,2)}'
+        )
+        self.assertEqual(minify(".q { content: '/* не комментарий */' }"), ".q{content:'/* не комментарий */'}")
+
+    def test_hashed_url_is_immutable_compressed_and_cached(self):
+        url = self.first.css_url
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), b'.page{color:red}a :hover{color:blue}')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, b'.page{color:red}a :hover{color:blue}')
+
+    def test_url_changes_with_css_and_old_url_redirects(self):
+        old_url = self.first.css_url
+        self.first.css_styles = '.page { color: green }'
+        self.first.save()
+        self.assertNotEqual(self.first.css_url, old_url)
+        self.assertRedirects(self.client.get(old_url), self.first.css_url)
+
+    def test_bundle_merges_templates_in_order(self):
+        url = reverse('albums:template_css_bundle', args=[
+            f'{self.second.pk},{self.first.pk}', css_digest(self.second.css_styles, self.first.css_styles)
+        ])
+        response = self.client.get(url)
+        self.assertEqual(response.content, b'.photo{margin:0}\n.page{color:red}a :hover{color:blue}')
+
+
+class TemplateRegistryTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='registry@example.com', first_name='a', last_name='b', username='registry'
+        )
+        cls.classic = AlbumTemplate.objects.create(name='Классический')
+
+    def test_default_template_costs_no_query_in_steady_state(self):
+        registry.all()
+        with CaptureQueriesContext(connection) as ctx:
+            album = Album.objects.create(user=self.user, title='Без шаблона')
+        self.assertEqual(album.layout_template, self.classic)
+        self.assertFalse([q for q in ctx.captured_queries if 'albums_albumtemplate' in q['sql']])
+
+    def test_other_worker_reloads_after_version_bump(self):
+        worker = TemplateRegistry()
+        self.assertEqual(worker.get(self.classic.pk).name, 'Классический')
+        with self.assertNumQueries(0):
+            worker.get(self.classic.pk)
+
+        self.classic.name = 'Новый'
+        self.classic.save()
+        self.assertEqual(worker.get(self.classic.pk).name, 'Новый')
+        self.assertIsNone(worker.default())
+
+
+class FragmentCacheTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='fragments@example.com', first_name='a', last_name='b', username='fragments'
+        )
+        AlbumTemplate.objects.create(name='Классический')
+        cls.album = Album.objects.create(user=cls.user, title='Первый')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def album_queries(self, url, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response, [q for q in ctx.captured_queries if 'albums_album"' in q['sql']]
+
+    def test_unchanged_partial_comes_from_cache(self):
+        url = reverse('albums:my_albums_html')
+        first, queries = self.album_queries(url)
+        self.assertTrue(queries)
+        second, queries = self.album_queries(url)
+        self.assertEqual(queries, [])
+        self.assertEqual(first.content, second.content)
+
+    def test_write_bumps_user_version(self):
+        url = reverse('albums:my_albums_html')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Album.objects.create(user=self.user, title='Второй')
+        self.assertContains(self.client.get(url), 'Второй')
+
+    def test_hx_trigger_revalidates(self):
+        url = reverse('albums:my_albums_html')
+        self.client.get(url)
+        Album.objects.create(user=self.user, title='Второй')  # версия сменится только после коммита
+        self.assertNotContains(self.client.get(url), 'Второй')
+        self.assertContains(self.client.get(url, headers={'HX-Trigger': 'refresh-albums'}), 'Второй')
+
+    def test_matching_etag_gets_304(self):
+        url = reverse('albums:account_details')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_csrf_token_is_not_cached(self):
+        url = reverse('albums:create_album_form')
+        response = self.client.get(url)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode())
+        self.assertNotEqual(token.group(1), fragments.CSRF_PLACEHOLDER)
+        key = fragments.fragment_key('create_album_form', self.user.pk, registry.version())
+        self.assertIn(fragments.CSRF_PLACEHOLDER, cache.get(key))
+
+
+class CachedAuthTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='auth@example.com', first_name='a', last_name='b', username='auth', password='pass-12345'
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(email='auth@example.com', password='pass-12345')
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in ctx.captured_queries if re.search(r'"(django_session|albums_user)"', q['sql'])]
+
+    def test_steady_state_page_needs_no_auth_queries(self):
+        url = reverse('albums:account_details')
+        self.auth_queries(url)
+        self.assertEqual(self.auth_queries(url), [])
+
+    def test_user_change_drops_snapshot(self):
+        url = reverse('albums:account_details')
+        self.auth_queries(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(username='renamed')
+            User.objects.get(pk=self.user.pk).save()
+        self.assertContains(self.client.get(url), 'renamed')
+
+    def test_password_change_still_ends_other_sessions(self):
+        url = reverse('albums:account_details')
+        self.auth_queries(url)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('other-12345')
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class ClaimsJWTTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='jwt@example.com', first_name='a', last_name='b', username='jwt', password='pass-12345'
+        )
+        AlbumTemplate.objects.create(name='Классический')
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        response = self.api.post(
+            reverse('albums:token_obtain_pair'), {'email': 'jwt@example.com', 'password': 'pass-12345'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.tokens = response.json()
+
+    def get_templates(self, access):
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.api.get(reverse('albums:template-list'))
+
+    def refresh(self):
+        return self.api.post(reverse('albums:token_refresh'), {'refresh': self.tokens['refresh']})
+
+    def test_authenticates_from_claims_without_queries(self):
+        self.assertEqual(self.get_templates(self.tokens['access']).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_templates(self.tokens['access']).status_code, 200)
+
+    def test_claim_change_outdates_access_and_refresh_renews_claims(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_premium = True
+            self.user.save()
+        self.assertEqual(self.get_templates(self.tokens['access']).status_code, 401)
+
+        response = self.refresh()
+        self.assertEqual(response.status_code, 200)
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        registry.all()
+        with self.assertNumQueries(0):
+            user = self.api.get(reverse('albums:template-list')).wsgi_request.user
+        self.assertTrue(user.is_premium)
+
+    def test_password_change_revokes_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('other-12345')
+            self.user.save()
+        self.assertEqual(self.get_templates(self.tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh().status_code, 401)
+
+
+class ThrottlingTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='throttle@example.com', first_name='a', last_name='b', username='throttle'
+        )
+        AlbumTemplate.objects.create(name='Классический')
+        cls.album = Album.objects.create(user=cls.user, title='Загрузки')
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def fuzzy(self):
+        return self.api.get(reverse('albums:album-fuzzy'), {'q': 'загрузки'})
+
+    @override_settings(THROTTLE_BUCKETS={'search': {'user': '2/min', 'ip': '100/min'}})
+    def test_empty_bucket_answers_429_with_retry_after(self):
+        self.assertEqual(self.fuzzy().status_code, 200)
+        self.assertEqual(self.fuzzy().status_code, 200)
+        response = self.fuzzy()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    @override_settings(THROTTLE_BUCKETS={'search': {'user': '100/min', 'ip': '1/min'}})
+    def test_ip_bucket_is_shared_between_users(self):
+        self.assertEqual(self.fuzzy().status_code, 200)
+        self.api.force_authenticate(None)
+        self.assertEqual(self.fuzzy().status_code, 429)
+
+    @override_settings(THROTTLE_BUCKETS={'search': {'user': '100/min', 'ip': '2/min'}})
+    def test_spoofed_forwarded_for_does_not_refill_ip_bucket(self):
+        self.api.force_authenticate(None)
+        statuses = [
+            self.api.get(reverse('albums:album-fuzzy'), {'q': 'загрузки'}, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}').status_code
+            for i in range(4)
+        ]
+        self.assertEqual(statuses, [200, 200, 429, 429])
+
+    def test_busy_scope_answers_503_and_releases_slot(self):
+        semaphore = throttling._semaphore('search')
+        with mock.patch.object(semaphore, 'acquire', return_value=False):
+            response = self.fuzzy()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        for _ in range(settings.CONCURRENCY_LIMITS['search'] + 1):
+            self.assertEqual(self.fuzzy().status_code, 200)
+
+    @override_settings(THROTTLE_BUCKETS={'upload': {'user': '1/min', 'ip': '100/min'}})
+    def test_upload_form_post_is_throttled(self):
+        self.client.force_login(self.user)
+        url = reverse('albums:upload_photo', args=[self.album.pk])
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.assertEqual(self.client.post(url).status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"photos": [' + b'{"title": "photo", "brightness": 1.0},' * 200 + b'{}]}'
+
+    def respond(self, response, accept='gzip, deflate, br'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_response_is_compressed(self):
+        response = self.respond(HttpResponse(self.body, content_type='application/json'))
+        self.assertIn(response['Content-Encoding'], COMPRESSORS)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        if response['Content-Encoding'] == 'gzip':
+            self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_image_and_refused_responses_are_left_alone(self):
+        small = self.respond(HttpResponse(b'{}', content_type='application/json'))
+        image = self.respond(HttpResponse(self.body, content_type='image/jpeg'))
+        refused = self.respond(HttpResponse(self.body), accept='gzip;q=0, br;q=0')
+        for response in (small, image, refused):
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response_is_compressed_chunk_by_chunk(self):
+        chunks = [self.body[:1000], self.body[1000:]]
+        response = self.respond(StreamingHttpResponse(iter(chunks)), accept='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        decompressor = zlib.decompressobj(31)
+        parts = [decompressor.decompress(data) for data in response.streaming_content]
+        # После каждого куска клиент уже может его распаковать
+        self.assertEqual(parts[0], chunks[0])
+        self.assertEqual(b''.join(parts), self.body)
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate('gzip;q=0.5, identity'), 'gzip')
+        self.assertEqual(negotiate('*'), next(iter(COMPRESSORS)))
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate('*;q=0'))
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'title': 'Свадьба\u2028',
+        'created_at': timezone.make_aware(datetime(2026, 5, 1, 12, 30, 15, 123456), dt_timezone.utc),
+        'price': Decimal('9.90'),
+        'photos': [{'id': 1, 'brightness': 1.5}],
+        2: None,
+    }
+
+    def test_output_matches_drf_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_non_finite_floats_are_left_to_drf(self):
+        for value in (float('nan'), float('inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                FastJSONRenderer().render({'photos': [{'brightness': value}]})
+
+    def test_parser_round_trip_and_errors(self):
+        body = FastJSONRenderer().render(self.data)
+        parsed = FastJSONParser().parse(io.BytesIO(body))
+        self.assertEqual(parsed, JSONParser().parse(io.BytesIO(body)))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"a": NaN}'))
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+
+class SparseFieldsTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='sparse@example.com', first_name='a', last_name='b', username='sparse'
+        )
+        AlbumTemplate.objects.create(name='Классический')
+        cls.album = Album.objects.create(user=cls.user, title='Выборочно', is_public=True)
+        for i in range(3):
+            photo = Photo.objects.create(album=cls.album, title=f'P{i}', image=f'photos/{i}.jpg')
+            PhotoEdit.objects.create(photo=photo, brightness=i)
+        AlbumPage.objects.create(album=cls.album, page_number=1)
+
+    def setUp(self):
+        super().setUp()
+        registry.all()
+        self.api = APIClient()
+        self.detail_url = reverse('albums:album-detail', args=[self.album.pk])
+        patcher = mock.patch.object(view_counter, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(view_counter.flush)
+
+    def test_fields_limit_output_and_queries(self):
+        with self.assertNumQueries(2):  # валидаторы + сам альбом, без фото и страниц
+            response = self.api.get(self.detail_url, {'fields': 'id,title'})
+        self.assertEqual(response.json(), {'id': self.album.pk, 'title': 'Выборочно'})
+
+    def test_dotted_fields_reach_nested_serializers(self):
+        response = self.api.get(self.detail_url, {'fields': 'id,photos.title'})
+        self.assertEqual(response.json()['photos'], [{'title': f'P{i}'} for i in range(3)])
+
+    def test_expand_adds_nested_to_list(self):
+        url = reverse('albums:album-list')
+        self.assertNotIn('template_details', self.api.get(url).json()['results'][0])
+        album = self.api.get(url, {'fields': 'id', 'expand': 'template_details'}).json()['results'][0]
+        self.assertEqual(set(album), {'id', 'template_details'})
+        self.assertEqual(album['template_details']['name'], 'Классический')
+
+    def test_sparse_response_is_not_cached_as_full(self):
+        self.api.get(self.detail_url, {'fields': 'title'})
+        self.assertEqual(len(self.api.get(self.detail_url).json()['photos']), 3)
+
+
+class BatchTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='batch@example.com', first_name='a', last_name='b', username='batch'
+        )
+        AlbumTemplate.objects.create(name='Классический')
+        cls.album = Album.objects.create(user=cls.user, title='Пачкой')
+        cls.photos = [
+            Photo.objects.create(album=cls.album, title=f'P{i}', image=f'photos/{i}.jpg', order_index=i)
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def batch(self, *requests):
+        return self.api.post(reverse('albums:batch'), {'requests': list(requests)}, format='json')
+
+    def reorder(self, photo, index):
+        return {'method': 'POST', 'path': f'/api/photos/{photo.pk}/reorder/', 'body': {'order_index': index}}
+
+    def test_sub_requests_run_in_one_transaction(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.batch(
+                self.reorder(self.photos[0], 5),
+                self.reorder(self.photos[1], 4),
+                {'method': 'GET', 'path': f'/api/photos/?album={self.album.pk}&fields=id,order_index'},
+            )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [200, 200, 200])
+        self.assertEqual([photo['order_index'] for photo in results[2]['data']['results']], [4, 5])
+        self.assertEqual(sum(1 for q in ctx.captured_queries if q['sql'].startswith(('SAVEPOINT', 'BEGIN'))), 1)
+
+    def test_failed_item_rolls_back_everything(self):
+        response = self.batch(
+            self.reorder(self.photos[0], 5),
+            {'method': 'POST', 'path': f'/api/photos/{self.photos[1].pk}/reorder/', 'body': {}},
+            self.reorder(self.photos[1], 4),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.json()['results']], [200, 400, 424])
+        self.photos[0].refresh_from_db()
+        self.assertEqual(self.photos[0].order_index, 0)
+
+    def test_rolled_back_batch_leaves_no_cached_detail_or_views(self):
+        patcher = mock.patch.object(view_counter, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(view_counter.flush)
+        path = f'/api/albums/{self.album.pk}/'
+        response = self.batch(
+            {'method': 'PATCH', 'path': path, 'body': {'title': 'Откатится'}},
+            {'method': 'GET', 'path': path},
+            {'method': 'GET', 'path': '/api/albums/999999/'},
+        )
+        self.assertEqual([result['status'] for result in response.json()['results']], [200, 200, 404])
+        self.assertEqual(response.json()['results'][1]['data']['title'], 'Откатится')
+        self.assertEqual(view_counter.pending(self.album.pk), 0)
+
+        self.assertEqual(self.api.get(path).json()['title'], 'Пачкой')
+
+    def test_rolled_back_batch_does_not_keep_uncommitted_templates(self):
+        def save_template(request, item):
+            AlbumTemplate.objects.create(name='Призрак')
+            registry.all()  # реестр перечитан внутри транзакции
+            return {'status': 400, 'data': None}
+
+        with mock.patch('albums.batch.run_one', side_effect=save_template):
+            self.batch({'method': 'GET', 'path': '/api/templates/'})
+        self.assertIsNone(registry.by_name('Призрак'))
+
+    def test_only_rest_endpoints_are_allowed(self):
+        for path in ('/profile/', '/api/albums/create-quick/', '/api/batch/'):
+            response = self.batch({'method': 'POST', 'path': path})
+            self.assertEqual(response.json()['results'][0]['status'], 400)
+
+
+class BulkPhotoTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='bulk@example.com', first_name='a', last_name='b', username='bulk'
+        )
+        cls.other = User.objects.create_user(
+            email='other@example.com', first_name='a', last_name='b', username='other'
+        )
+        cls.album = Album.objects.create(user=cls.user, title='Много')
+        cls.target = Album.objects.create(user=cls.user, title='Куда')
+        cls.foreign = Album.objects.create(user=cls.other, title='Чужой')
+        cls.photos = [
+            Photo.objects.create(album=cls.album, title=f'P{i}', image=f'photos/{i}.jpg', order_index=i)
+            for i in range(20)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_patch = override_settings(MEDIA_ROOT=media.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.url = reverse('albums:photo-bulk')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def image(self, name):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (2, 2)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_update_is_constant_in_queries(self):
+        data = [{'id': photo.pk, 'order_index': 100 - photo.order_index} for photo in self.photos]
+        data[0]['album'] = self.target.pk
+        with self.assertNumQueries(7):
+            response = self.client.patch(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 20)
+        self.assertEqual(
+            sorted(Photo.objects.filter(album=self.album).values_list('order_index', flat=True)),
+            list(range(81, 100))
+        )
+        self.assertEqual(Photo.objects.get(pk=self.photos[0].pk).album, self.target)
+
+    def test_album_limit_is_checked_for_whole_batch(self):
+        Photo.objects.bulk_create(
+            Photo(album=self.target, image=f'photos/t{i}.jpg') for i in range(MAX_ALBUM_PHOTOS - 1)
+        )
+        data = [{'id': photo.pk, 'album': self.target.pk} for photo in self.photos[:2]]
+        response = self.client.patch(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Photo.objects.filter(pk=self.photos[0].pk, album=self.target).exists())
+
+    def test_foreign_albums_are_rejected(self):
+        response = self.client.patch(
+            self.url, [{'id': self.photos[0].pk, 'album': self.foreign.pk}], format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.other)
+        response = self.client.delete(self.url, [self.photos[0].pk], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Photo.objects.filter(pk=self.photos[0].pk).exists())
+
+    def test_tombstoned_album_photos_are_untouchable(self):
+        tombstone_album(self.album)
+        response = self.client.patch(self.url, [{'id': self.photos[0].pk, 'title': 'X'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete(self.url, [self.photos[0].pk], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Photo.objects.get(pk=self.photos[0].pk).title, 'P0')
+
+    def test_delete_removes_photos_and_edits(self):
+        doomed = self.photos[:10]
+        for photo in doomed:
+            PhotoEdit.objects.create(photo=photo, brightness=5)
+        self.album.cover_photo = doomed[0]
+        self.album.save()
+
+        with mock.patch('albums.deletion.background.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(self.url, [photo.pk for photo in doomed], format='json')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Photo.objects.filter(album=self.album).count(), 10)
+        self.assertFalse(PhotoEdit.objects.filter(photo_id__in=[photo.pk for photo in doomed]).exists())
+        self.album.refresh_from_db()
+        self.assertIsNone(self.album.cover_photo_id)
+        submit.assert_called_once()
+
+    def test_create_uploads_files(self):
+        response = self.client.post(
+            self.url, {'album': self.target.pk, 'image': [self.image('a.png'), self.image('b.png')]},
+            format='multipart'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([photo['title'] for photo in response.json()], ['a.png', 'b.png'])
+        self.assertEqual(self.target.photos.count(), 2)
+
+        response = self.client.post(self.url, {'album': self.target.pk}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+
+class EditPresetTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='preset@example.com', first_name='a', last_name='b', username='preset'
+        )
+        cls.other = User.objects.create_user(
+            email='stranger@example.com', first_name='a', last_name='b', username='stranger'
+        )
+        cls.album = Album.objects.create(user=cls.user, title='Лето', is_public=True)
+        cls.photos = [
+            Photo.objects.create(album=cls.album, image=f'photos/{i}.jpg', order_index=i) for i in range(30)
+        ]
+        PhotoEdit.objects.create(photo=cls.photos[0], brightness=-5)
+        cls.preset = EditPreset.objects.create(user=cls.user, name='Тёплый', brightness=10, saturation=20)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('albums:album-apply-preset', kwargs={'pk': self.album.pk})
+
+    def test_apply_preset_writes_in_bulk(self):
+        with self.assertNumQueries(10):
+            response = self.client.post(self.url, {'preset_id': self.preset.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'applied': 30})
+        photos = Photo.objects.filter(album=self.album).select_related('current_edit')
+        self.assertTrue(all(
+            (photo.current_edit.brightness, photo.current_edit.saturation) == (10, 20) for photo in photos
+        ))
+        self.assertEqual(Photo.objects.get(pk=self.photos[0].pk).edits_count, 2)
+        self.assertEqual(Photo.objects.get(pk=self.photos[1].pk).edits_count, 1)
+
+    def test_foreign_preset_and_album_are_rejected(self):
+        foreign = EditPreset.objects.create(user=self.other, name='Чужой')
+        self.assertEqual(self.client.post(self.url, {'preset_id': foreign.pk}).status_code, 404)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.post(self.url, {'preset_id': foreign.pk}).status_code, 403)
+        self.assertFalse(PhotoEdit.objects.filter(brightness=0, photo__album=self.album).exists())
+
+    def test_presets_belong_to_owner(self):
+        url = reverse('albums:preset-list')
+        self.assertEqual(self.client.post(url, {'name': 'Тёплый'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'name': 'Холодный', 'brightness': -10}).status_code, 201)
+        self.assertEqual([p['name'] for p in self.client.get(url).json()['results']], ['Тёплый', 'Холодный'])
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url).json()['results'], [])
+        detail = reverse('albums:preset-detail', kwargs={'pk': self.preset.pk})
+        self.assertEqual(self.client.delete(detail).status_code, 404)
+
+
+class SyncTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='sync@example.com', first_name='a', last_name='b', username='syncer'
+        )
+        cls.other = User.objects.create_user(
+            email='nosy@example.com', first_name='a', last_name='b', username='nosy'
+        )
+        AlbumTemplate.objects.create(name='Классический')
+        cls.album = Album.objects.create(user=cls.user, title='Офлайн')
+        cls.photo = Photo.objects.create(album=cls.album, image='photos/sync.jpg')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('albums:sync')
+
+    def sync(self, since):
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_first_sync_is_reset_with_cursor(self):
+        data = self.client.get(self.url).json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['cursor'], ChangeLog.objects.latest('pk').pk)
+
+    def test_up_to_date_client_gets_empty_response(self):
+        cursor = sync.latest_cursor()
+        with self.assertNumQueries(2):
+            data = self.sync(cursor)
+        self.assertEqual(data['cursor'], cursor)
+        self.assertEqual(data['albums'] + data['photos'] + data['pages'] + data['edits'], [])
+
+    def test_changes_and_tombstones_since_cursor(self):
+        cursor = sync.latest_cursor()
+        edit = PhotoEdit.objects.create(photo=self.photo, brightness=7)
+        page = AlbumPage.objects.create(album=self.album, page_number=1)
+        doomed = Photo.objects.create(album=self.album, image='photos/doomed.jpg').pk
+        Photo.objects.filter(pk=doomed).delete()
+        Album.objects.create(user=self.other, title='Чужой')
+
+        data = self.sync(cursor)
+        self.assertFalse(data['reset'])
+        self.assertEqual([album['id'] for album in data['albums']], [self.album.pk])
+        self.assertEqual(data['albums'][0]['photos_count'], 1)
+        self.assertEqual([photo['current_edit']['id'] for photo in data['photos']], [edit.pk])
+        self.assertEqual([p['id'] for p in data['pages']], [page.pk])
+        self.assertEqual([e['brightness'] for e in data['edits']], [7])
+        self.assertEqual(data['deleted']['photos'], [doomed])
+
+        tombstone_album(self.album)
+        data = self.sync(data['cursor'])
+        self.assertEqual(data['albums'], [])
+        self.assertEqual(data['deleted']['albums'], [self.album.pk])
+        self.assertEqual(self.sync(data['cursor'])['deleted']['albums'], [])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_changes_are_paged(self):
+        cursor = sync.latest_cursor()
+        for i in range(3):
+            AlbumPage.objects.create(album=self.album, page_number=i + 1)
+
+        first = self.sync(cursor)
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['cursor'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len(first['pages'] + second['pages']), 3)
+
+    def test_pruned_cursor_gets_reset(self):
+        cursor = sync.latest_cursor()
+        AlbumPage.objects.create(album=self.album, page_number=1)
+        AlbumPage.objects.create(album=self.album, page_number=2)
+        self.assertGreater(sync.prune(days=-1), 0)
+
+        self.assertTrue(self.sync(cursor)['reset'])
+        self.assertFalse(self.sync(sync.latest_cursor())['reset'])
+
+
+class LiveEventsTests(AlbumsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='live@example.com', first_name='a', last_name='b', username='live', password='password123'
+        )
+        cls.other = User.objects.create_user(
+            email='peek@example.com', first_name='a', last_name='b', username='peek'
+        )
+        AlbumTemplate.objects.create(name='Классический')
+        cls.album = Album.objects.create(user=cls.user, title='Живой', is_public=True)
+        cls.private = Album.objects.create(user=cls.other, title='Секрет')
+
+    def test_broker_delivers_from_other_threads(self):
+        async def scenario():
+            subscription = events.broker.subscribe(['album:1', 'user:1'])
+            try:
+                thread = threading.Thread(
+                    target=events.broker.publish, args=(['album:1', 'user:1'], {'type': 'ping'})
+                )
+                thread.start()
+                thread.join()
+                self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 1), {'type': 'ping'})
+                self.assertTrue(subscription.queue.empty())
+            finally:
+                events.broker.unsubscribe(subscription)
+
+        asyncio.run(scenario())
+        self.assertFalse(events.broker.has_subscribers(['album:1', 'user:1']))
+
+    def test_nothing_is_published_without_subscribers(self):
+        with mock.patch.object(events.broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                Photo.objects.create(album=self.album, image='photos/quiet.jpg')
+        publish.assert_not_called()
+
+    @override_settings(SSE_ENABLED=True, SSE_HEARTBEAT_SECONDS=0.05)
+    async def test_album_stream_pushes_changes(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('albums:album_events', args=[self.album.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertNotIn('Content-Encoding', response)
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await anext(stream)).startswith(b'retry:'))
+
+            def upload():
+                with self.captureOnCommitCallbacks(execute=True):
+                    return Photo.objects.create(album=self.album, image='photos/live.jpg')
+
+            photo = await sync_to_async(upload)()
+            chunk = await asyncio.wait_for(anext(stream), 1)
+            self.assertIn(f'"type":"photo_added","album":{self.album.pk},"photo":{photo.pk}'.encode(), chunk)
+            self.assertEqual(await asyncio.wait_for(anext(stream), 1), b': ping\n\n')
+        finally:
+            await stream.aclose()
+            await sync_to_async(response.close)()
+        self.assertFalse(events.broker.has_subscribers([events.album_channel(self.album.pk)]))
+
+    @override_settings(SSE_ENABLED=True)
+    async def test_private_album_and_anonymous_user_are_rejected(self):
+        response = await self.async_client.get(reverse('albums:album_events', args=[self.private.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('albums:my_events'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_disabled_by_default_and_under_wsgi(self):
+        patcher = mock.patch.object(view_counter, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(view_counter.flush)
+        self.client.force_login(self.user)
+        for url in (reverse('albums:album_detail', args=[self.album.pk]), reverse('albums:profile')):
+            self.assertNotContains(self.client.get(url), 'EventSource')
+        # Под WSGI (тестовый Client) поток не отдаётся, даже если SSE включён
+        with override_settings(SSE_ENABLED=True):
+            self.assertContains(self.client.get(reverse('albums:profile')), 'EventSource')
+            response = self.client.get(reverse('albums:album_events', args=[self.album.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
@@ -0,0 +1,163 @@
+"""Ограничение дорогих действий: загрузка фото и поиск.
+
+Частота - token bucket по пользователю и по IP (THROTTLE_BUCKETS,
+состояние в общем кэше): ведро на capacity запросов пополняется
+равномерно за period. Пустое ведро - сразу 429 с Retry-After.
+
+Одновременность - семафор на процесс (CONCURRENCY_LIMITS): если все
+места заняты, не ждём в очереди, а сразу отвечаем 503 с Retry-After,
+чтобы загрузки одного клиента не заняли все воркеры и блокировку
+записи SQLite.
+
+Во вьюсетах - BucketThrottle (DEFAULT_THROTTLE_CLASSES) и
+LimitedActionsMixin, в обычных вьюхах - декоратор limited().
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+OVERLOAD_RETRY_AFTER = 1
+
+_bucket_lock = threading.Lock()
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 60)"""
+    count, period = rate.split('/')
+    return int(count), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+def take(key, rate):
+    """Берёт жетон из ведра. 0 - можно, иначе через сколько секунд появится жетон.
+    Атомарно только внутри процесса, между воркерами - приблизительно"""
+    capacity, period = parse_rate(rate)
+    now = time.time()
+    with _bucket_lock:
+        tokens, at = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - at) * capacity / period)
+        if tokens < 1:
+            cache.set(key, (tokens, now), period)
+            return math.ceil((1 - tokens) * period / capacity)
+        cache.set(key, (tokens - 1, now), period)
+        return 0
+
+
+def client_ip(request):
+    """IP для ведра: X-Forwarded-For учитывается только за NUM_PROXIES своих прокси"""
+    return BaseThrottle().get_ident(request)
+
+
+def check(request, scope):
+    """None - запрос проходит, иначе Retry-After в секундах"""
+    rates = settings.THROTTLE_BUCKETS[scope]
+    keys = [('ip', client_ip(request))]
+    if request.user.is_authenticated:
+        keys.insert(0, ('user', request.user.pk))
+    for kind, ident in keys:
+        wait = take(f'albums:throttle:{scope}:{kind}:{ident}', rates[kind])
+        if wait:
+            return wait
+    return None
+
+
+def _semaphore(scope):
+    with _semaphores_lock:
+        if scope not in _semaphores:
+            _semaphores[scope] = threading.BoundedSemaphore(settings.CONCURRENCY_LIMITS[scope])
+        return _semaphores[scope]
+
+
+@contextmanager
+def occupy(scope):
+    """Занимает место в scope; внутри блока - False, если мест нет"""
+    semaphore = _semaphore(scope)
+    acquired = semaphore.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            semaphore.release()
+
+
+def retry_response(status_code, wait):
+    response = HttpResponse(status=status_code)
+    response['Retry-After'] = str(wait)
+    return response
+
+
+def limited(scope, methods=('POST',)):
+    """Декоратор для обычных вьюх: частота и одновременность для methods"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return view(request, *args, **kwargs)
+            wait = check(request, scope)
+            if wait:
+                return retry_response(status.HTTP_429_TOO_MANY_REQUESTS, wait)
+            with occupy(scope) as acquired:
+                if not acquired:
+                    return retry_response(status.HTTP_503_SERVICE_UNAVAILABLE, OVERLOAD_RETRY_AFTER)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервис перегружен, повторите позже.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait=OVERLOAD_RETRY_AFTER):
+        super().__init__()
+        self.wait = wait  # обработчик исключений DRF выставит Retry-After
+
+
+class BucketThrottle(BaseThrottle):
+    """Token bucket для вьюх с limit_scope() (LimitedActionsMixin)"""
+
+    def allow_request(self, request, view):
+        scope = view.limit_scope() if hasattr(view, 'limit_scope') else None
+        self._wait = check(request, scope) if scope else None
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+class LimitedActionsMixin:
+    """limited_actions - {action: scope}. Список с ?search= идёт в scope 'search'"""
+    limited_actions = {}
+
+    def limit_scope(self):
+        if self.action == 'list' and self.request.query_params.get('search'):
+            return 'search'
+        return self.limited_actions.get(self.action)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        scope = self.limit_scope()
+        if scope:
+            semaphore = _semaphore(scope)
+            if not semaphore.acquire(blocking=False):
+                raise Overloaded()
+            self._semaphore = semaphore
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Вызывается и после исключений в обработчике
+        semaphore = getattr(self, '_semaphore', None)
+        if semaphore is not None:
+            self._semaphore = None
+            semaphore.release()
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,123 @@
+"""JWT с данными пользователя в клеймах.
+
+Access-токен несёт user_id, username, is_premium, premium_until и ver -
+отпечаток этих полей, is_active и пароля. ClaimsJWTAuthentication
+собирает пользователя из клеймов и сверяет ver с отпечатком в кэше, так
+что запрос к API не ходит в БД. Отпечаток считается из БД при промахе
+кэша и одинаков во всех воркерах; сигналы (signals.py) сбрасывают его
+при сохранении пользователя. Если отпечаток поменялся (смена пароля,
+премиума, блокировка), старые access-токены отклоняются и клиент берёт
+новый через refresh.
+
+Refresh всегда читает пользователя из БД и отклоняет токен после смены
+пароля или блокировки; новый access получает свежие клеймы.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.crypto import salted_hmac
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .backends import partial_user
+from .models import User
+
+CLAIM_FIELDS = ('username', 'is_premium', 'premium_until')
+VERSION_FIELDS = ('id', *CLAIM_FIELDS, 'is_active', 'password')
+
+
+def fingerprint(*values):
+    # Даты - числом: из формы и из БД приходят в разных часовых поясах
+    values = [value.timestamp() if isinstance(value, datetime) else value for value in values]
+    return salted_hmac('albums.tokens', repr(values)).hexdigest()[:16]
+
+
+def version_key(user_id):
+    return f'albums:tokens:version:{user_id}'
+
+
+def user_version(user):
+    return fingerprint(*(getattr(user, field) for field in VERSION_FIELDS))
+
+
+def password_version(user):
+    return fingerprint(user.pk, user.password)
+
+
+def current_version(user_id):
+    """Отпечаток пользователя из кэша, при промахе - из БД. None - пользователя нет"""
+    version = cache.get(version_key(user_id))
+    if version is None:
+        values = User.objects.filter(pk=user_id, is_active=True).values_list(*VERSION_FIELDS).first()
+        if values is None:
+            return None
+        version = fingerprint(*values)
+        cache.set(version_key(user_id), version, settings.TOKEN_VERSION_CACHE_SECONDS)
+    return version
+
+
+def invalidate_version(user_id):
+    cache.delete(version_key(user_id))
+    transaction.on_commit(lambda: cache.delete(version_key(user_id)))
+
+
+def set_claims(token, user):
+    token['username'] = user.username
+    token['is_premium'] = user.is_premium
+    token['premium_until'] = user.premium_until.isoformat() if user.premium_until else None
+    token['ver'] = user_version(user)
+
+
+class ClaimsRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_claims(token, user)
+        token['pwd'] = password_version(user)
+        return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not user.is_active or refresh.get('pwd') != password_version(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        data = super().validate(attrs)
+        access = refresh.access_token
+        set_claims(access, user)
+        data['access'] = str(access)
+        return data
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """Пользователь из клеймов access-токена, без запроса к БД"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+            values = {field: validated_token[field] for field in CLAIM_FIELDS}
+            version = validated_token['ver']
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if version != current_version(user_id):
+            raise AuthenticationFailed(_('Token is outdated'), code='token_outdated')
+
+        values['premium_until'] = values['premium_until'] and parse_datetime(values['premium_until'])
+        return partial_user({'id': user_id, 'is_active': True, **values})
@@ -0,0 +1,55 @@
+"""Рейтинг популярных альбомов: считается периодически, читается из TrendingAlbum.
+
+score = (log(1 + фото) + VIEWS_WEIGHT * log(1 + просмотры)) * 0.5 ** (возраст / период полураспада)
+
+Возраст считается от updated_at, так что свежие и недавно дополненные
+альбомы поднимаются, а старые постепенно уходят вниз даже при большом
+числе просмотров.
+"""
+import heapq
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Album, TrendingAlbum
+
+MIN_PHOTOS = 3
+VIEWS_WEIGHT = 2.0
+
+
+def trending_score(photos, views, updated_at, now, half_life_hours):
+    age_hours = max((now - updated_at).total_seconds() / 3600, 0)
+    activity = math.log1p(photos) + VIEWS_WEIGHT * math.log1p(views)
+    return activity * 0.5 ** (age_hours / half_life_hours)
+
+
+def compute_trending(size=None):
+    """Пересчитывает таблицу TrendingAlbum, возвращает число строк"""
+    size = size or settings.TRENDING_SIZE
+    half_life = settings.TRENDING_HALF_LIFE_HOURS
+    now = timezone.now()
+
+    candidates = (
+        Album.objects.public()
+        .with_photo_stats()
+        .filter(photos_total__gte=MIN_PHOTOS)
+        .order_by()
+        .values_list('pk', 'photos_total', 'views_count', 'updated_at')
+    )
+    top = heapq.nlargest(
+        size,
+        (
+            (trending_score(photos, views, updated_at, now, half_life), pk)
+            for pk, photos, views, updated_at in candidates.iterator()
+        )
+    )
+
+    with transaction.atomic():
+        TrendingAlbum.objects.all().delete()
+        TrendingAlbum.objects.bulk_create([
+            TrendingAlbum(album_id=pk, rank=rank, score=score, computed_at=now)
+            for rank, (score, pk) in enumerate(top, start=1)
+        ])
+    return len(top)
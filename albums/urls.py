@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from . import views
 from django.conf import settings
 from django.conf.urls.static import static
@@ -12,6 +13,7 @@ router.register(r'photos', views.PhotoViewSet, basename='photo')
 router.register(r'templates', views.AlbumTemplateViewSet, basename='template')
 router.register(r'pages', views.AlbumPageViewSet, basename='page')
 router.register(r'edits', views.PhotoEditViewSet, basename='edit')
+router.register(r'presets', views.EditPresetViewSet, basename='preset')
 
 app_name = 'albums'
 
@@ -21,6 +23,13 @@ urlpatterns = [
     path('my-albums/', views.my_albums_html, name='my_albums_html'),
     path('albums/<int:album_id>/upload/', views.upload_photo, name='upload_photo'),
     path('albums/<int:album_id>/', views.album_detail, name='album_detail'),
+
+    # CSS шаблонов по URL с хэшем содержимого (albums/template_css.py)
+    path('css/templates/<int:template_id>/<str:digest>.css', views.album_template_css, name='template_css'),
+    path(
+        'css/templates/bundle/<str:template_ids>/<str:digest>.css',
+        views.album_templates_css_bundle, name='template_css_bundle'
+    ),
     
     # Юзер
     path('register/', views.register, name='register'),
@@ -31,6 +40,20 @@ urlpatterns = [
     path('update-account-details/', views.update_account_details, name='update_account_details'),
     path('logout/', views.logout_view, name='logout'),
 
+    # JWT (albums/tokens.py)
+    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Несколько запросов к API одним (albums/batch.py)
+    path('api/batch/', views.batch, name='batch'),
+
+    # Изменения для офлайн-клиентов (albums/sync.py)
+    path('api/sync/', views.sync_changes, name='sync'),
+
+    # Живые обновления по SSE, нужен ASGI (albums/events.py)
+    path('events/albums/<int:album_id>/', views.album_events, name='album_events'),
+    path('events/me/', views.my_events, name='my_events'),
+
     # REST API routes (автоматически генерируются из router)
     path('api/', include(router.urls)),
 ]
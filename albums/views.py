@@ -3,23 +3,40 @@ from django.contrib.auth import login, authenticate, logout, update_session_auth
 from django.contrib.auth.decorators import login_required
 from .forms import CustomUserCreationForm, CustomUserLoginForm, CustomUserUpdateForm
 from .models import User
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Sum
+from django.db import transaction
+from django.db.models import Q, F, Count, Max, Sum, Prefetch
 from django.utils import timezone
 from datetime import timedelta
 import uuid
-from django.http import HttpResponse
-
-from .models import Album, Photo, AlbumTemplate, AlbumPage, PhotoEdit
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse
+
+from .models import (
+    Album, Photo, AlbumTemplate, AlbumPage, PhotoEdit, PhotoEditHistory, EditPreset, ChangeLog
+)
+from . import caching, edits, events, fragments, search, sync, template_css
+from .batch import in_batch, run_batch
+from .conditional import ConditionalGetMixin, child_stats
+from .counters import view_counter
+from .deletion import delete_photos, tombstone_album
+from .pagination import TrendingCursorPagination
+from .registry import registry
+from .tasks import background
+from .throttling import LimitedActionsMixin, limited
+from .trending import compute_trending
 from .serializers import (
     AlbumDetailSerializer, AlbumListSerializer, AlbumCreateSerializer,
     PhotoSerializer, AlbumTemplateSerializer, AlbumPageSerializer,
-    PhotoEditSerializer
+    PhotoEditSerializer, EditPresetSerializer, BatchSerializer, as_pk, field_requested, sparse_params
 )
 
 def register(request):
@@ -29,7 +46,7 @@ def register(request):
         form = CustomUserCreationForm(request.POST) #Берём данные, что нам дал пользователь и проверяем на валидность
         if form.is_valid():
             user = form.save() #Сохраняем в нашей бд 
-            login(request, user, backend='django.contrib.backends.ModelBackend') #Логиним
+            login(request, user) #Логиним
             return redirect('albums:profile')
     else:
         form = CustomUserCreationForm() #Выводим пустую форму в случае ошибки
@@ -44,7 +61,7 @@ def login_view(request):
         form = CustomUserLoginForm(request=request, data=request.POST)
         if form.is_valid(): #Проверяем валидность
             user = form.get_user() #Берём нашего юзера и логиним его
-            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            login(request, user)
             return redirect('albums:profile')
     else:
         form = CustomUserLoginForm()
@@ -55,12 +72,13 @@ def login_view(request):
 @login_required
 def profile_views(request):
     albums = request.user.albums.all()
-    templates = AlbumTemplate.objects.filter(is_premium=False)
+    templates = registry.free()
     
     context = {
         'user': request.user,
         'albums': albums,
         'templates': templates,
+        'sse_enabled': settings.SSE_ENABLED,
         'user_stats': {
             'total_albums': albums.count(),
             'is_premium': request.user.is_premium
@@ -71,12 +89,14 @@ def profile_views(request):
 @login_required
 def my_albums_html(request):
     """HTML список моих альбомов для HTMX"""
-    albums = request.user.albums.all()
-    return render(request, 'albums/partials/albums_list.html', {
-        'albums': albums
-    })
+    return fragments.render_fragment(
+        request, 'my_albums', 'albums/partials/albums_list.html',
+        lambda: {'albums': request.user.albums.with_photo_stats()},
+        revalidate_on=('refresh-albums',),
+    )
 
 @login_required
+@limited('upload')
 def upload_photo(request, album_id):
     """Загрузка фото в альбом"""
     try:
@@ -100,20 +120,21 @@ def upload_photo(request, album_id):
 @login_required
 def albums_list_partial(request):
     """Partial для списка альбомов в профиле"""
-    albums = request.user.albums.all().select_related('layout_template')[:6]
-    serializer = AlbumListSerializer(albums, many=True)
-    return render(request, 'albums/partials/albums_list.html', {
-        'albums': albums
-    })
+    return fragments.render_fragment(
+        request, 'albums_list', 'albums/partials/albums_list.html',
+        lambda: {'albums': request.user.albums.with_photo_stats()[:6]},
+        revalidate_on=('refresh-albums',),
+    )
 
 
 @login_required
 def create_album_form(request):
     """Форма создания альбома для HTMX"""
-    templates = AlbumTemplate.objects.filter(is_premium=False)[:5]  # бесплатные
-    return render(request, 'albums/partials/create_album_form.html', {
-        'templates': templates
-    })
+    return fragments.render_fragment(
+        request, 'create_album_form', 'albums/partials/create_album_form.html',
+        lambda: {'templates': registry.free()[:5]},  # бесплатные
+        scope=(registry.version(),),
+    )
     
 
 @login_required
@@ -141,12 +162,16 @@ def create_quick_album(request):
 @login_required
 def album_detail(request, album_id):
     album = Album.objects.get(id=album_id)
+    # Обновление по событию SSE (hx-get) - не новый просмотр
+    if not request.headers.get('HX-Request'):
+        view_counter.record(album.id)
     photos = album.photos.all().order_by('order_index')
     pages = album.pages.all()
     return render(request, 'albums/album_detail.html', {
         'album': album,
         'photos': photos,
-        'pages': pages
+        'pages': pages,
+        'sse_enabled': settings.SSE_ENABLED,
     })
 
 
@@ -173,6 +198,7 @@ def create_album_pages(album, page_size=4):
 
 
 @login_required
+@limited('upload')
 def upload_photo(request, album_id):
     """Загрузка фото в альбом"""
     try:
@@ -209,19 +235,92 @@ def update_album_pages(album, page_size=4):
         page_number = i // page_size + 1
         AlbumPage.objects.create(album=album, page_number=page_number)
 
-def album_template_css(request, template_id):
+def album_template_css(request, template_id, digest):
+    """CSS шаблона по неизменяемому URL (albums/template_css.py)"""
+    return _template_css(request, [template_id], digest)
+
+
+def album_templates_css_bundle(request, template_ids, digest):
+    """CSS нескольких шаблонов одним файлом: /css/templates/bundle/1,2,3/<hash>.css"""
     try:
-        template = AlbumTemplate.objects.get(id=template_id)
-        return HttpResponse(template.css_styles, content_type='text/css')
-    except AlbumTemplate.DoesNotExist:
-        return HttpResponse("", content_type='text/css')
+        ids = [int(pk) for pk in template_ids.split(',')]
+    except ValueError:
+        raise Http404
+    return _template_css(request, ids, digest)
+
+
+def _template_css(request, template_ids, digest):
+    compiled = template_css.load(template_ids, digest)
+    if compiled is None:
+        # Стили поменялись - старая ссылка ведёт на новый URL
+        url = template_css.current_url(template_ids)
+        if url is None:
+            raise Http404
+        return redirect(url)
+    return template_css.css_response(request, compiled)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch(request):
+    """POST /api/batch/ - подзапросы к API в одной транзакции (albums/batch.py)"""
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    results, ok = run_batch(request, serializer.validated_data['requests'])
+    return Response(
+        {'results': results},
+        status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST
+    )
+
+
+def sse_available(request):
+    """Под WSGI поток SSE не отдаём (занял бы воркер навсегда)"""
+    return settings.SSE_ENABLED and isinstance(request, ASGIRequest)
+
+
+async def album_events(request, album_id):
+    """SSE: изменения альбома (albums/events.py); приватный - только владельцу"""
+    if not sse_available(request):
+        # 204 - EventSource больше не переподключается
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    user = await request.auser()
+    if not await Album.objects.visible_to(user).filter(pk=album_id).aexists():
+        raise Http404
+    return events.event_stream(events.album_channel(album_id))
+
+
+async def my_events(request):
+    """SSE: изменения всех своих альбомов (albums/events.py)"""
+    if not sse_available(request):
+        # 204 - EventSource больше не переподключается
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return events.event_stream(events.user_channel(user.pk))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """GET /api/sync/?since=<курсор> - изменения своих альбомов после курсора (albums/sync.py)"""
+    since = request.query_params.get('since')
+    if since is None:
+        return Response(sync.reset())
+    since = as_pk(since)
+    if since is None or since < 0:
+        return Response({'detail': 'since должен быть неотрицательным числом'}, status=status.HTTP_400_BAD_REQUEST)
+    if sync.is_stale(since):
+        return Response(sync.reset())
+    return Response(sync.changes(request.user, since))
 
 
 @login_required
 def account_details(request):
-    user = User.objects.get(id=request.user.id)
-    return render(request, 'albums/partials/account_details.html',
-                  {'user': user})
+    return fragments.render_fragment(
+        request, 'account_details', 'albums/partials/account_details.html',
+        lambda: {'user': request.user},
+    )
 
 
 @login_required
@@ -249,8 +348,9 @@ def logout_view(request):
     logout(request)
     return redirect('albums:register')
 
-class AlbumViewSet(viewsets.ModelViewSet):
+class AlbumViewSet(LimitedActionsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet для альбомов"""
+    limited_actions = {'fuzzy': 'search'}
     queryset = Album.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -270,22 +370,106 @@ class AlbumViewSet(viewsets.ModelViewSet):
         return AlbumDetailSerializer
     
     def get_queryset(self):
-        """Получить QuerySet для текущего пользователя"""
+        """Получить QuerySet для текущего пользователя; связи - только для полей,
+        которые попадут в ответ (?fields= / ?expand=)"""
         user = self.request.user
+        wants = partial(field_requested, self.request)
         
         # Для list view: свои альбомы + публичные
         if self.action == 'list':
-            if user.is_authenticated:
-                return Album.objects.filter(
-                    Q(user=user) | Q(is_public=True)
-                ).select_related('layout_template', 'user').prefetch_related('photos')
-            return Album.objects.filter(is_public=True).select_related('layout_template', 'user')
+            albums = Album.objects.visible_to(user)
+            if wants('template_name') or wants('template_details', default=False):
+                albums = albums.select_related('layout_template')
+            if wants('user_username'):
+                albums = albums.select_related('user')
+            if wants('photos', default=False):
+                albums = albums.prefetch_related(self.photos_prefetch())
+            if wants('photos_count') or wants('album_size_mb'):
+                albums = albums.with_photo_stats()
+            return albums
+        
+        # Чужой приватный альбом посмотреть нельзя, изменить - тем более
+        albums = Album.objects.visible_to(user) if self.action == 'retrieve' else Album.objects
         
         # Для остальных: все с оптимизацией запросов
-        return Album.objects.select_related(
-            'layout_template', 'user', 'cover_photo'
-        ).prefetch_related('photos', 'pages', 'comments')
+        if wants('template_details'):
+            albums = albums.select_related('layout_template')
+        if wants('user_username') or wants('user_is_premium'):
+            albums = albums.select_related('user')
+        if wants('photos'):
+            albums = albums.prefetch_related(self.photos_prefetch())
+        elif wants('photos_count') or wants('album_size_mb'):
+            albums = albums.with_photo_stats()
+        if wants('pages'):
+            albums = albums.prefetch_related('pages')
+        return albums
+
+    def photos_prefetch(self):
+        photos = Photo.objects.all()
+        if field_requested(self.request, 'photos.current_edit'):
+            photos = photos.select_related('current_edit')
+        return Prefetch('photos', queryset=photos)
     
+    def list_state(self):
+        albums = self.filter_queryset(Album.objects.visible_to(self.request.user))
+        return tuple(albums.order_by().aggregate(
+            changed=Max('updated_at'),
+            total=Count('pk', distinct=True),
+            templates_changed=Max('layout_template__updated_at'),
+            photos_changed=Max('photos__updated_at'),
+            photos_total=Count('photos'),
+        ).values()) + (caching.owners_changed(),)
+
+    def object_state(self, pk):
+        state = Album.objects.visible_to(self.request.user).filter(pk=pk).annotate(
+            **child_stats(Photo, 'album', 'photos'),
+            **child_stats(Photo, 'album', 'edits', 'current_edit__updated_at'),
+            **child_stats(AlbumPage, 'album', 'pages'),
+        ).values_list(
+            'updated_at', 'layout_template__updated_at', 'user__username', 'user__is_premium',
+            'photos_changed', 'photos_total', 'edits_changed', 'pages_changed', 'pages_total'
+        ).first()
+        if state is None:
+            return None
+        return state + (caching.owners_changed(),)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Детали альбома из кэша (albums/caching.py) или 304; просмотр уходит в буфер, а не в БД"""
+        # Кэшируется только полный ответ, ?fields= / ?expand= сериализуем заново
+        sparse = sparse_params(request) != (None, {})
+        # Внутри batch кэш может хранить ещё не сброшенные или откатываемые данные
+        cached = not sparse and not in_batch(request)
+        entry = caching.get_detail(kwargs['pk'], request.user) if cached else None
+        if entry is None:
+            state = self.lookup_state()
+            if state is None:
+                raise Http404
+        else:
+            state = entry['state']
+        
+        etag, modified = self.validators(state)
+        response = self.not_modified(etag, modified)
+        if response is None:
+            if entry is None:
+                instance = self.get_object()
+                data = self.get_serializer(instance).data
+                if not sparse:
+                    # В кэш - просмотры из БД, буфер добавляем при каждой отдаче
+                    data['views_count'] = instance.views_count
+                if cached:
+                    caching.set_detail(instance, request.user, data, state)
+            else:
+                data = entry['data']
+            if not sparse:
+                data = {**data, 'views_count': data['views_count'] + view_counter.pending(data['id'])}
+            response = self.with_validators(Response(data), etag, modified)
+        
+        if in_batch(request):
+            transaction.on_commit(partial(view_counter.record, int(kwargs['pk'])))
+        else:
+            view_counter.record(int(kwargs['pk']))
+        return response
+
     def perform_create(self, serializer):
         """Создание альбома с текущим пользователем"""
         serializer.save(user=self.request.user)
@@ -297,10 +481,10 @@ class AlbumViewSet(viewsets.ModelViewSet):
         serializer.save()
     
     def perform_destroy(self, instance):
-        """Удаление альбома"""
+        """Удаление альбома: сразу скрываем, строки и файлы удаляются в фоне"""
         if instance.user != self.request.user:
             raise serializers.ValidationError('Вы не можете удалить чужой альбом')
-        instance.delete()
+        tombstone_album(instance)
     
     # ========== CUSTOM ACTIONS ==========
     
@@ -313,7 +497,9 @@ class AlbumViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        albums = request.user.albums.all().select_related('layout_template').prefetch_related('photos')
+        albums = request.user.albums.select_related(
+            'layout_template', 'user'
+        ).with_photo_stats().order_by('-created_at')
         
         # Фильтрация
         is_public = request.query_params.get('is_public')
@@ -341,9 +527,14 @@ class AlbumViewSet(viewsets.ModelViewSet):
         albums = user.albums.all()
         
         # Статистика
-        total_albums = albums.count()
-        total_photos = sum(album.photos.count() for album in albums)
-        total_size_bytes = albums.aggregate(total=Sum('photos__file_size'))['total'] or 0
+        totals = albums.aggregate(
+            total_albums=Count('id', distinct=True),
+            total_photos=Count('photos'),
+            total_size=Sum('photos__file_size')
+        )
+        total_albums = totals['total_albums']
+        total_photos = totals['total_photos']
+        total_size_bytes = totals['total_size'] or 0
         total_size_mb = round(total_size_bytes / 1024 / 1024, 2)
         
         # Популярные шаблоны
@@ -368,19 +559,53 @@ class AlbumViewSet(viewsets.ModelViewSet):
     
     @action(methods=['GET'], detail=False)
     def popular(self, request):
-        """GET /albums/popular/ - Популярные публичные альбомы"""
-        albums = Album.objects.filter(
-            is_public=True,
-            photos__isnull=False
+        """GET /albums/popular/ - Популярные публичные альбомы (из предрасчитанного рейтинга)"""
+        albums = Album.objects.public().filter(
+            trending__isnull=False
         ).annotate(
-            photo_count=Count('photos')
-        ).filter(
-            photo_count__gte=3
-        ).distinct().order_by('-updated_at')[:10]
-        
-        serializer = AlbumListSerializer(albums, many=True)
-        return Response(serializer.data)
-    
+            trending_rank=F('trending__rank')
+        ).select_related('layout_template', 'user').with_photo_stats()
+
+        paginator = TrendingCursorPagination()
+        page = paginator.paginate_queryset(albums, request, view=self)
+        if not page and paginator.cursor is None and cache.add(
+            'albums:trending:cold-start', True, settings.TRENDING_COLD_START_SECONDS
+        ):
+            # Рейтинг ещё не считался: отдаём пустую страницу, считаем в фоне и не
+            # чаще раза за период (пустой рейтинг не должен пересчитываться на каждый запрос)
+            background.submit(compute_trending)
+        serializer = AlbumListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=False)
+    def fuzzy(self, request):
+        """GET /albums/fuzzy/?q=... - Поиск с опечатками по публичным альбомам и никнеймам"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'detail': 'q required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+
+        albums = search.fuzzy_albums(query, limit)
+        users = search.fuzzy_users(query, limit)
+
+        album_data = AlbumListSerializer([album for _, album in albums], many=True).data
+        for item, (score, _) in zip(album_data, albums):
+            item['similarity'] = round(score, 3)
+
+        return Response({
+            'albums': album_data,
+            'users': [
+                {'id': user.id, 'username': user.username, 'similarity': round(score, 3)}
+                for score, user in users
+            ]
+        })
+
     @action(methods=['POST'], detail=True)
     def publish(self, request, pk=None):
         """POST /albums/{id}/publish/ - Опубликовать альбом"""
@@ -437,9 +662,8 @@ class AlbumViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            template = AlbumTemplate.objects.get(id=template_id)
-        except AlbumTemplate.DoesNotExist:
+        template = registry.get(template_id)
+        if template is None:
             return Response(
                 {'detail': 'Шаблон не найден'},
                 status=status.HTTP_404_NOT_FOUND
@@ -457,9 +681,30 @@ class AlbumViewSet(viewsets.ModelViewSet):
         serializer = AlbumDetailSerializer(album)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(methods=['POST'], detail=True)
+    def apply_preset(self, request, pk=None):
+        """POST /albums/{id}/apply_preset/ - Применить пресет правки ко всем фото альбома"""
+        album = self.get_object()
+        if album.user_id != request.user.pk:
+            return Response(
+                {'detail': 'Вы не можете изменить чужой альбом'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        preset = EditPreset.objects.filter(user=request.user, pk=as_pk(request.data.get('preset_id'))).first()
+        if preset is None:
+            return Response({'detail': 'Пресет не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+        created = edits.apply_preset(preset, album.photos.order_by().values_list('pk', flat=True))
+        # bulk_create сигналов не шлёт - сбрасываем кэш альбома один раз
+        caching.invalidate_albums([album.pk])
+        events.notify('edit_applied', album.pk, album.user_id)
+        return Response({'applied': len(created)}, status=status.HTTP_200_OK)
 
-class PhotoViewSet(viewsets.ModelViewSet):
+
+class PhotoViewSet(LimitedActionsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet для фотографий"""
+    limited_actions = {'create': 'upload', 'bulk': 'upload'}
     queryset = Photo.objects.all()
     serializer_class = PhotoSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -472,12 +717,72 @@ class PhotoViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Получить фото только из доступных альбомов"""
         user = self.request.user
-        if user.is_authenticated:
-            return Photo.objects.filter(
-                Q(album__user=user) | Q(album__is_public=True)
-            ).select_related('album')
-        return Photo.objects.filter(album__is_public=True).select_related('album')
+        photos = Photo.objects.filter(
+            album__in=Album.objects.visible_to(user)
+        ).select_related('album')
+        if field_requested(self.request, 'current_edit'):
+            photos = photos.select_related('current_edit')
+        return photos
+
+    def list_state(self):
+        return tuple(self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            changed=Max('updated_at'),
+            edits_changed=Max('current_edit__updated_at'),
+            total=Count('pk'),
+        ).values())
+
+    def object_state(self, pk):
+        return self.get_queryset().filter(pk=pk).values_list(
+            'updated_at', 'current_edit__updated_at'
+        ).first()
     
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Массовые операции над фото своих альбомов (PhotoListSerializer):
+        POST /photos/bulk/ - album и несколько image (multipart),
+        PATCH - [{"id": ..., поля}], DELETE - [id, ...]"""
+        if request.method == 'POST':
+            album = request.POST.get('album')
+            data = [
+                {'album': album, 'image': file, 'title': file.name}
+                for file in request.FILES.getlist('image')
+            ]
+            serializer = self.get_serializer(data=data, many=True)
+            touched = set()
+        else:
+            items = request.data if isinstance(request.data, list) else []
+            if request.method == 'PATCH':
+                items = [item.get('id') for item in items if isinstance(item, dict)]
+            ids = {as_pk(pk) for pk in items} - {None}
+            photos = list(
+                # Album.objects - без альбомов, ждущих удаления
+                Photo.objects.filter(pk__in=ids, album__in=Album.objects.filter(user=request.user))
+                .select_related('album', 'current_edit')
+            )
+            if not ids or len(photos) != len(ids):
+                return Response({'detail': 'Фото не найдены'}, status=status.HTTP_400_BAD_REQUEST)
+            if request.method == 'DELETE':
+                delete_photos(photos)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            serializer = self.get_serializer(photos, data=request.data, many=True, partial=True)
+            touched = {photo.album_id for photo in photos}
+
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic(), sync.batched():
+            photos = serializer.save()
+            # bulk_create / bulk_update сигналов не шлют - сбрасываем кэш и пишем журнал один раз
+            touched |= {photo.album_id for photo in photos}
+            caching.invalidate_albums(touched)
+            fragments.bump_users([request.user.pk])
+            sync.record(request.user.pk, ChangeLog.KIND_PHOTO, [photo.pk for photo in photos])
+            sync.record(request.user.pk, ChangeLog.KIND_ALBUM, touched)
+            for album_id in touched:
+                events.notify('photos_changed', album_id, request.user.pk)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK
+        )
+
     @action(methods=['POST'], detail=True)
     def reorder(self, request, pk=None):
         """POST /photos/{id}/reorder/ - Изменить порядок"""
@@ -506,8 +811,21 @@ class PhotoViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['GET'], detail=True)
+    def history(self, request, pk=None):
+        """GET /photos/{id}/history/ - Правки фото, включая сжатую историю"""
+        photo = self.get_object()
+        history = PhotoEditHistory.objects.filter(photo=photo).first()
+        compacted = edits.replay(history) if history else []
+        recent = PhotoEdit.objects.filter(photo=photo).order_by('-created_at', '-pk')
+        return Response({
+            'edits_count': photo.edits_count,
+            'edits': PhotoEditSerializer(recent, many=True).data,
+            'compacted': [{'at': at, **state} for at, state in reversed(compacted)],
+        })
+
 
-class AlbumTemplateViewSet(viewsets.ReadOnlyModelViewSet):
+class AlbumTemplateViewSet(LimitedActionsMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для шаблонов (только чтение)"""
     queryset = AlbumTemplate.objects.all()
     serializer_class = AlbumTemplateSerializer
@@ -515,23 +833,64 @@ class AlbumTemplateViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'name']
     ordering = ['-created_at']
-    filterset_fields = ['template_type', 'is_premium']
+    filterset_fields = ['is_premium']
+    
+    # С этими параметрами список фильтруется в БД, без них - берётся из реестра
+    query_params = ('is_premium', 'search', 'ordering')
+    
+    def uses_query(self):
+        return any(param in self.request.query_params for param in self.query_params)
     
     def get_queryset(self):
         """✅ Проверяем ТВОЁ поле is_premium из User"""
         user = self.request.user
         
+        # Без фильтров - список из реестра шаблонов (albums/registry.py), без запроса
+        if not self.uses_query():
+            return registry.available_to(user)
+        
         # Если пользователь премиум, показываем все шаблоны
         if user.is_authenticated and user.is_premium:
             return AlbumTemplate.objects.all()
         
         # Иначе только бесплатные
         return AlbumTemplate.objects.filter(is_premium=False)
+
+    def filter_queryset(self, queryset):
+        if isinstance(queryset, list):
+            return queryset
+        return super().filter_queryset(queryset)
+
+    def available_template(self, pk):
+        template = registry.get(pk)
+        user = self.request.user
+        if template is None or (template.is_premium and not (user.is_authenticated and user.is_premium)):
+            return None
+        return template
+
+    def get_object(self):
+        template = self.available_template(self.kwargs['pk'])
+        if template is None:
+            raise Http404
+        self.check_object_permissions(self.request, template)
+        return template
+
+    def list_state(self):
+        templates = self.filter_queryset(self.get_queryset())
+        if isinstance(templates, list):
+            return (max((t.updated_at for t in templates), default=None), len(templates))
+        return tuple(templates.order_by().aggregate(
+            changed=Max('updated_at'), total=Count('pk')
+        ).values())
+
+    def object_state(self, pk):
+        template = self.available_template(pk)
+        return (template.updated_at,) if template else None
     
     @action(methods=['GET'], detail=False)
     def available(self, request):
         """GET /templates/available/ - Доступные для меня шаблоны"""
-        templates = self.get_queryset()
+        templates = registry.available_to(request.user)
         serializer = AlbumTemplateSerializer(templates, many=True)
         return Response(serializer.data)
 
@@ -545,6 +904,10 @@ class AlbumPageViewSet(viewsets.ModelViewSet):
     ordering_fields = ['page_number']
     ordering = ['page_number']
 
+    def get_queryset(self):
+        """Страницы только доступных (и не удалённых) альбомов"""
+        return AlbumPage.objects.filter(album__in=Album.objects.visible_to(self.request.user))
+
 
 class PhotoEditViewSet(viewsets.ModelViewSet):
     """ViewSet для редактирования фото"""
@@ -553,4 +916,25 @@ class PhotoEditViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     filterset_fields = ['photo']
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
\ No newline at end of file
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        """Правки фото только из доступных (и не удалённых) альбомов"""
+        return PhotoEdit.objects.filter(photo__album__in=Album.objects.visible_to(self.request.user))
+
+    def perform_destroy(self, instance):
+        """Удаление правки с переносом указателя текущей правки"""
+        edits.discard_edit(instance)
+
+
+class EditPresetViewSet(viewsets.ModelViewSet):
+    """ViewSet для пресетов правок текущего пользователя"""
+    serializer_class = EditPresetSerializer
+    permission_classes = [IsAuthenticated]
+    ordering = ['name']
+
+    def get_queryset(self):
+        return EditPreset.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
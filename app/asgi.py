@@ -3,6 +3,9 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Живые обновления по SSE (albums/events.py) работают только под ASGI и
+рассчитаны на один воркер: SSE_ENABLED=1 uvicorn app.asgi:application --workers 1
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
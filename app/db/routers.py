@@ -0,0 +1,63 @@
+"""
+Роутер чтение/запись: чтение уходит в реплику, запись - в основную БД.
+
+После записи сессия "прилипает" к основной БД на REPLICA_PIN_SECONDS,
+чтобы пользователь сразу видел свои изменения (read-your-writes):
+внутри запроса - через contextvar, между запросами - через cookie,
+которую ставит app.middleware.ReplicaPinMiddleware.
+"""
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+def reset_pin():
+    _pinned.set(False)
+    _wrote.set(False)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def wrote_to_primary():
+    return _wrote.get()
+
+
+def replica_available():
+    return REPLICA_ALIAS in connections.settings
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not replica_available() or is_pinned():
+            return DEFAULT_DB_ALIAS
+        # Чтение внутри транзакции должно видеть её же незакоммиченные строки
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной БД, объекты из них можно связывать
+        databases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплики накатывает репликация, а не migrate
+        return db != REPLICA_ALIAS
@@ -0,0 +1,162 @@
+"""
+SQLite-бэкенд для продакшена: WAL, прагмы, BEGIN IMMEDIATE и сериализация записи.
+
+В settings.DATABASES:
+
+    'ENGINE': 'app.db.sqlite3',
+    'OPTIONS': {
+        'pragmas': {'cache_size': -64000},   # поверх DEFAULT_PRAGMAS
+        'write_retries': 5,
+        'retry_backoff': 0.05,
+    }
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',           # читатели не блокируются писателем
+    'synchronous': 'NORMAL',         # в WAL fsync только на checkpoint
+    'busy_timeout': 5000,            # мс ожидания чужой блокировки
+    'cache_size': -20000,            # ~20 МБ страничного кэша на соединение
+    'mmap_size': 128 * 1024 * 1024,  # чтение через mmap
+    'temp_store': 'MEMORY',
+}
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Один замок записи на файл БД в пределах процесса
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def write_lock_for(name):
+    with _write_locks_guard:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+def is_locked_error(exc):
+    return 'locked' in str(exc)
+
+
+def is_write(query):
+    return query.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    """Одиночные записи в autocommit повторяем при "database is locked".
+    Внутри транзакции не повторяем: её целиком держит замок записи."""
+    db = None
+
+    def execute(self, query, params=None):
+        if self.db is None or self.db.in_atomic_block or not is_write(query):
+            return super().execute(query, params)
+        return self.db.run_write(base.SQLiteCursorWrapper.execute, self, query, params)
+
+    def executemany(self, query, param_list):
+        if self.db is None or self.db.in_atomic_block or not is_write(query):
+            return super().executemany(query, param_list)
+        return self.db.run_write(base.SQLiteCursorWrapper.executemany, self, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **kwargs.pop('pragmas', {})}
+        self.write_retries = kwargs.pop('write_retries', 5)
+        self.retry_backoff = kwargs.pop('retry_backoff', 0.05)
+        # Без IMMEDIATE транзакция берёт блокировку записи только на первом
+        # UPDATE, и две такие транзакции ловят SQLITE_BUSY без ожидания
+        if self.transaction_mode is None:
+            self.transaction_mode = 'IMMEDIATE'
+        kwargs.setdefault('timeout', self.pragmas['busy_timeout'] / 1000)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        if not self.is_in_memory_db():
+            for name, value in self.pragmas.items():
+                conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.db = self
+        return cursor
+
+    # ---------- сериализация записи ----------
+
+    @property
+    def write_lock(self):
+        return write_lock_for(self.settings_dict['NAME'])
+
+    def serializes_writes(self):
+        # В in-memory БД тестов замок не нужен и только мешал бы TestCase
+        return not self.is_in_memory_db()
+
+    def _acquire_write_lock(self):
+        timeout = self.pragmas['busy_timeout'] / 1000
+        if not self.write_lock.acquire(timeout=timeout):
+            raise OperationalError('database is locked')
+
+    def run_write(self, func, *args):
+        """Запись с ограниченным числом повторов и экспоненциальной паузой"""
+        if not self.serializes_writes():
+            return func(*args)
+        for attempt in range(self.write_retries + 1):
+            self._acquire_write_lock()
+            try:
+                return func(*args)
+            except (sqlite3.OperationalError, OperationalError) as exc:
+                if not is_locked_error(exc) or attempt == self.write_retries:
+                    raise
+            finally:
+                self.write_lock.release()
+            time.sleep(self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def _start_transaction_under_autocommit(self):
+        """Транзакция держит замок записи процесса до commit/rollback,
+        потоки встают в очередь, а не крутят busy-цикл SQLite"""
+        if not self.serializes_writes():
+            return super()._start_transaction_under_autocommit()
+        self._acquire_write_lock()
+        self._holds_write_lock = True
+        try:
+            for attempt in range(self.write_retries + 1):
+                try:
+                    return super()._start_transaction_under_autocommit()
+                except OperationalError as exc:
+                    if not is_locked_error(exc) or attempt == self.write_retries:
+                        raise
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        except BaseException:
+            self._release_write_lock()
+            raise
+
+    def _release_write_lock(self):
+        if getattr(self, '_holds_write_lock', False):
+            self._holds_write_lock = False
+            self.write_lock.release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._release_write_lock()
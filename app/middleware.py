@@ -0,0 +1,166 @@
+import re
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from app.db import routers
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него сжимаем gzip
+    brotli = None
+
+
+class ReplicaPinMiddleware:
+    """Держит сессию на основной БД REPLICA_PIN_SECONDS после её последней записи"""
+    cookie_name = 'db_pinned_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset_pin()
+        if self.pinned_until(request) > time.time():
+            routers.pin_to_primary()
+
+        response = self.get_response(request)
+
+        if routers.wrote_to_primary():
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                self.cookie_name, str(int(time.time() + seconds)),
+                max_age=seconds, httponly=True, samesite='Lax'
+            )
+        routers.reset_pin()
+        return response
+
+    def pinned_until(self, request):
+        try:
+            return int(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            return 0
+
+
+class GzipCompressor:
+    encoding = 'gzip'
+
+    def __init__(self):
+        self._stream = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._stream.compress(data)
+
+    def flush(self):
+        return self._stream.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._stream.flush()
+
+
+class BrotliCompressor:
+    encoding = 'br'
+
+    def __init__(self):
+        self._stream = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._stream.process(data)
+
+    def flush(self):
+        return self._stream.flush()
+
+    def finish(self):
+        return self._stream.finish()
+
+
+COMPRESSORS = {'br': BrotliCompressor, 'gzip': GzipCompressor} if brotli else {'gzip': GzipCompressor}
+
+
+def compress(body, encoding):
+    compressor = COMPRESSORS[encoding]()
+    return compressor.compress(body) + compressor.finish()
+
+
+def negotiate(accept_encoding):
+    """Лучшее из COMPRESSORS, что принимает клиент (с учётом q=0), или None"""
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        q = re.search(r'q=([\d.]+)', params)
+        try:
+            accepted[coding.strip()] = float(q.group(1)) if q else 1.0
+        except ValueError:
+            continue
+    for encoding in COMPRESSORS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """Сжатие ответов brotli или gzip по Accept-Encoding.
+
+    Обычные ответы сжимаются целиком, если они не короче
+    COMPRESSION_MIN_SIZE и сжатие их уменьшает. Потоковые - по кускам,
+    с flush после каждого, чтобы клиент получал данные сразу. Уже сжатые
+    типы (картинки, видео, архивы) и ответы с Content-Encoding не трогаем.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, COMPRESSORS[encoding]())
+            del response.headers['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Сжатое тело - другие байты: сильный ETag становится слабым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compressible(self, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type.startswith(settings.COMPRESSION_SKIP_TYPES) and content_type != 'image/svg+xml':
+            return False
+        return response.streaming or len(response.content) >= settings.COMPRESSION_MIN_SIZE
+
+    def compress_stream(self, response, compressor):
+        chunks = response.streaming_content
+        if response.is_async:
+            async def compressed():
+                async for chunk in chunks:
+                    data = compressor.compress(chunk) + compressor.flush()
+                    if data:
+                        yield data
+                yield compressor.finish()
+            return compressed()
+
+        def compressed():
+            for chunk in chunks:
+                data = compressor.compress(chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        return compressed()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -51,14 +52,60 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # JSON через orjson, без него - стандартный (albums/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': (
+        'albums.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'albums.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Пользователь из клеймов токена, без запроса к БД (albums/tokens.py)
+        'albums.tokens.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
+    # Token bucket для загрузок и поиска (albums/throttling.py)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'albums.throttling.BucketThrottle',
+    ),
+    # Сколько своих прокси стоит перед приложением. 0 - ключ ведра по IP
+    # берётся из REMOTE_ADDR, X-Forwarded-For клиента не учитывается
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
+}
+
+# Сколько подзапросов принимает POST /api/batch/
+BATCH_MAX_REQUESTS = 50
+
+# GET /api/sync/: строк журнала изменений на ответ и сколько дней их хранить
+# (manage.py prune_sync_log); клиент с более старым курсором получает reset
+SYNC_PAGE_SIZE = 500
+SYNC_LOG_RETENTION_DAYS = 30
+
+# SSE (albums/events.py): включать только при запуске под ASGI (app.asgi, один
+# воркер) - под WSGI бесконечный поток занимает воркер навсегда.
+# Пинг в простое, пауза переподключения клиента,
+# сколько событий копить для медленного клиента до reset
+SSE_ENABLED = os.environ.get('SSE_ENABLED', '') == '1'
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 5000
+SSE_QUEUE_SIZE = 100
+
+# Token bucket: capacity запросов, пополняется за период - по пользователю и по IP
+THROTTLE_BUCKETS = {
+    'upload': {'user': '60/min', 'ip': '120/min'},
+    'search': {'user': '120/min', 'ip': '240/min'},
+}
+# Сколько таких запросов один процесс обрабатывает одновременно, остальным - 503
+CONCURRENCY_LIMITS = {
+    'upload': 2,
+    'search': 4,
 }
 
 CORS_ALLOWED_ORIGINS = [
@@ -69,10 +116,16 @@ CORS_ALLOWED_ORIGINS = [
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_OBTAIN_SERIALIZER': 'albums.tokens.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'albums.tokens.ClaimsTokenRefreshSerializer',
 }
+# Сколько живёт отпечаток пользователя для проверки access-токенов
+TOKEN_VERSION_CACHE_SECONDS = 3600
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.CompressionMiddleware',
+    'app.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,6 +134,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Сжатие ответов (app.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_SKIP_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff',
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/pdf',
+    # Сжатие SSE держало бы буфер zlib на каждое открытое соединение
+    'text/event-stream',
+)
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -106,10 +170,85 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 + WAL, прагмы, BEGIN IMMEDIATE и очередь записи (app/db/sqlite3/base.py)
+        'ENGINE': 'app.db.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Постоянные соединения: прагмы и mmap настраиваются один раз
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'busy_timeout': 5000,
+                'cache_size': -20000,
+                'mmap_size': 134217728,
+            },
+            'write_retries': 5,
+        },
+    }
+}
+
+# Реплика для чтения. Локально - второй файл SQLite, который обновляется
+# копией основного (sqlite3 db.sqlite3 ".backup db_replica.sqlite3" или litestream),
+# либо Postgres: DB_REPLICA_ENGINE=django.db.backends.postgresql и
+# DB_REPLICA_HOST/PORT/USER/PASSWORD
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': os.environ.get('DB_REPLICA_ENGINE', DATABASES['default']['ENGINE']),
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'HOST': os.environ.get('DB_REPLICA_HOST', ''),
+        'PORT': os.environ.get('DB_REPLICA_PORT', ''),
+        'USER': os.environ.get('DB_REPLICA_USER', ''),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', ''),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    # Прагмы и очередь записи понимает только наш бэкенд SQLite
+    if DATABASES['replica']['ENGINE'] == DATABASES['default']['ENGINE']:
+        DATABASES['replica']['OPTIONS'] = DATABASES['default']['OPTIONS']
+
+DATABASE_ROUTERS = ['app.db.routers.PrimaryReplicaRouter']
+
+# Кэш. Локально - память процесса; с несколькими воркерами нужен общий
+# (REDIS_URL=redis://127.0.0.1:6379/1), иначе инвалидация не дойдёт до соседей
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Сколько секунд после записи сессия читает из основной БД
+REPLICA_PIN_SECONDS = 5
+
+# Как часто буфер просмотров альбомов сбрасывается в БД
+VIEW_COUNT_FLUSH_SECONDS = 5
+
+# Рейтинг популярных альбомов (manage.py compute_trending)
+TRENDING_SIZE = 100
+TRENDING_HALF_LIFE_HOURS = 48
+# Пустой рейтинг до первого запуска cron: фоновый пересчёт не чаще раза за период
+TRENDING_COLD_START_SECONDS = 3600
+
+# Сжатие истории правок фото (manage.py compact_edits): сколько последних
+# правок держать строками, сколько дельт и сколько дней хранить в сжатой истории
+EDIT_HISTORY_KEEP = 5
+EDIT_HISTORY_MAX_DELTAS = 50
+EDIT_HISTORY_RETENTION_DAYS = 365
+
+# Фоновое удаление альбомов: сколько фото/страниц удалять за транзакцию
+ALBUM_PURGE_BATCH_SIZE = 50
+
+# Сколько живёт закэшированный ответ GET /api/albums/{id}/ (сбрасывается сигналами)
+ALBUM_DETAIL_CACHE_SECONDS = 300
+
+# Сколько живут HTML-фрагменты HTMX (albums/fragments.py), устаревают по версии пользователя
+FRAGMENT_CACHE_SECONDS = 600
 
 
 # Password validation
@@ -153,6 +292,10 @@ STATIC_URL = 'static/'
 
 
 AUTH_USER_MODEL = 'albums.User'
+# Пользователь из снимка в кэше (albums/backends.py), сессии - из кэша с записью в БД
+AUTHENTICATION_BACKENDS = ['albums.backends.CachedUserBackend']
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+USER_SNAPSHOT_CACHE_SECONDS = 3600
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/profile/'
 LOGOUT_REDIRECT_URL = '/register/'
\ No newline at end of file